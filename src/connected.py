@@ -14,19 +14,110 @@ roads = [
 ]
 
 N = 14 # number of cities
-S = list(range(N))
-print("# Initial state")
-print("S =", S)
-print("# Entering loop...")
-for p, q in roads:
-	rep_p = S[p]
-	rep_q = S[q]
-	new_rep = max(rep_p, rep_q)
-	for i in range(N):
-		if S[i] == rep_p or S[i] == rep_q:
-			S[i] = new_rep
-
-	print("S =", S)
-
-print("# After loop")
-print("S =", S)
+
+def relabel_components(N, roads, verbose = False):
+	S = list(range(N))
+	if verbose:
+		print("# Initial state")
+		print("S =", S)
+		print("# Entering loop...")
+	for p, q in roads:
+		rep_p = S[p]
+		rep_q = S[q]
+		new_rep = max(rep_p, rep_q)
+		for i in range(N):
+			if S[i] == rep_p or S[i] == rep_q:
+				S[i] = new_rep
+
+		if verbose: print("S =", S)
+
+	if verbose:
+		print("# After loop")
+		print("S =", S)
+	return S
+
+S = relabel_components(N, roads, verbose = True)
+
+
+## Union-find
+# Relabelling scans all N cities for every road, so the loop
+# above is O(N E). If we instead keep a tree per component, with
+# each city pointing to a parent and the root as representative,
+# a union only has to link two roots. Linking the smaller tree
+# below the larger (union by size) and pointing every city we
+# pass on the way to a root directly at the root (path
+# compression) makes each operation almost constant time.
+
+from array import array
+
+class UnionFind:
+	def __init__(self, n):
+		self.parent = array('l', range(n))
+		self.size = array('l', [1]) * n
+		self.components = n
+
+	def find(self, p):
+		parent = self.parent
+		root = p
+		while parent[root] != root:
+			root = parent[root]
+		while parent[p] != root: # path compression
+			parent[p], p = root, parent[p]
+		return root
+
+	def union(self, p, q):
+		p, q = self.find(p), self.find(q)
+		if p == q: return False
+		size = self.size
+		if size[p] < size[q]:
+			p, q = q, p
+		self.parent[q] = p
+		size[p] += size[q]
+		self.components -= 1
+		return True
+
+	def union_many(self, edges):
+		for p, q in edges:
+			self.union(p, q)
+		return self
+
+	def stream(self, edges):
+		# edges can be any iterable, e.g. a file we read
+		# line by line; we yield the number of components
+		# after each edge without keeping the edges around
+		for p, q in edges:
+			self.union(p, q)
+			yield self.components
+
+	def connected(self, p, q):
+		return self.find(p) == self.find(q)
+
+	def representatives(self):
+		return [self.find(p) for p in range(len(self.parent))]
+
+uf = UnionFind(N).union_many(roads)
+print("# Union-find")
+print("components =", uf.components)
+print("reps =", uf.representatives())
+print(list(UnionFind(N).stream(roads)))
+
+# Both approaches must agree on which cities are connected
+# even if they pick different representatives
+for p in range(N):
+	for q in range(N):
+		assert (S[p] == S[q]) == uf.connected(p, q)
+
+
+if __name__ == '__main__':
+	from random import randrange
+	from time import perf_counter
+	print("n edges algorithm seconds")
+	for n in (10**3, 10**4, 10**5, 10**6):
+		edges = [(randrange(n), randrange(n)) for _ in range(n)]
+		if n <= 10**4:
+			start = perf_counter()
+			relabel_components(n, edges)
+			print(n, len(edges), "relabel", round(perf_counter() - start, 3))
+		start = perf_counter()
+		UnionFind(n).union_many(edges)
+		print(n, len(edges), "union-find", round(perf_counter() - start, 3))
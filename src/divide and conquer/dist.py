@@ -25,6 +25,8 @@ def build_edit_table(x, y):
 
     return D
 
+loop_edit_table = build_edit_table # redefined below
+
 def edit_dist(x, y):
     D = build_edit_table(x, y)
     n, m = len(x), len(y)
@@ -67,3 +69,404 @@ def backtrack(D, x, y):
 
 D = build_edit_table(x, y)
 print(backtrack(D, x, y))
+
+
+## Vectorised tables
+# Filling the table one cell at a time from Python is the worst
+# way to use numpy. A whole row depends only on the row above,
+# except for the D[i, j - 1] + 1 term. If we first take
+#   T[j] = min(D[i - 1, j - 1] + cost, D[i - 1, j] + 1)
+# then D[i, j] = min over k <= j of T[k] + (j - k), which is a
+# running minimum of T[k] - k. All three steps are numpy calls.
+# Alternatively, all cells on an anti-diagonal i + j = d depend
+# only on the two previous anti-diagonals.
+#
+# The distances are at most max(n, m), so small signed integers
+# are enough; that makes the rows a quarter of the float64 size.
+
+def table_dtype(n, m):
+    return np.int16 if max(n, m) < 2**15 - 1 else np.int32
+
+def as_codes(x):
+    # one integer per character, so we can compare with numpy
+    if isinstance(x, np.ndarray):
+        return x
+    if isinstance(x, (bytes, bytearray)):
+        return np.frombuffer(x, dtype=np.uint8)
+    return np.frombuffer(x.encode('utf-32-le'), dtype=np.uint32)
+
+def kind(x):
+    for t in (str, (bytes, bytearray), np.ndarray):
+        if isinstance(x, t):
+            return t
+    return None
+
+def as_code_list(seqs):
+    # Strings, bytes and arrays have their own codes, but other
+    # sequences, such as lists of tokens, or a mix of kinds, we
+    # number by their distinct elements, so equal elements of all
+    # the sequences get equal codes.
+    kinds = {kind(s) for s in seqs}
+    if len(kinds) == 1 and None not in kinds:
+        return [as_codes(s) for s in seqs]
+    numbers = {}
+    def number(s):
+        return np.fromiter((numbers.setdefault(e, len(numbers)) for e in s),
+                           dtype=np.intp, count=len(s))
+    return [number(s) for s in seqs]
+
+def as_code_pair(x, y):
+    return tuple(as_code_list([x, y]))
+
+def next_row(prev, i, xi, yc, offsets):
+    row = np.empty_like(prev)
+    row[0] = i
+    np.minimum(prev[:-1] + (yc != xi), prev[1:] + 1, out=row[1:])
+    row -= offsets
+    np.minimum.accumulate(row, out=row)
+    row += offsets
+    return row
+
+def build_edit_table_rows(x, y):
+    n, m = len(x), len(y)
+    xc, yc = as_code_pair(x, y)
+    D = np.empty((n + 1, m + 1), dtype=table_dtype(n, m))
+    offsets = np.arange(m + 1, dtype=D.dtype)
+    D[0] = offsets
+    for i in range(1, n + 1):
+        D[i] = next_row(D[i - 1], i, xc[i - 1], yc, offsets)
+    return D
+
+def build_edit_table_diagonals(x, y):
+    n, m = len(x), len(y)
+    xc, yc = as_code_pair(x, y)
+    D = np.empty((n + 1, m + 1), dtype=table_dtype(n, m))
+    D[:, 0] = np.arange(n + 1)
+    D[0, :] = np.arange(m + 1)
+    for d in range(2, n + m + 1):
+        # inner cells (i, d - i) with 1 <= i <= n and 1 <= d - i <= m
+        i = np.arange(max(1, d - m), min(n, d - 1) + 1)
+        j = d - i
+        D[i, j] = np.minimum(
+            D[i - 1, j - 1] + (xc[i - 1] != yc[j - 1]),
+            np.minimum(D[i, j - 1], D[i - 1, j]) + 1
+        )
+    return D
+
+def build_edit_table(x, y, method = 'rows'):
+    if method == 'rows':
+        return build_edit_table_rows(x, y)
+    if method == 'diagonals':
+        return build_edit_table_diagonals(x, y)
+    raise ValueError("unknown method: {}".format(method))
+
+def last_row(x, y):
+    # only the previous row is needed to compute the next,
+    # so this uses O(m) memory
+    n, m = len(x), len(y)
+    xc, yc = as_code_pair(x, y)
+    offsets = np.arange(m + 1, dtype=table_dtype(n, m))
+    row = offsets.copy()
+    for i in range(1, n + 1):
+        row = next_row(row, i, xc[i - 1], yc, offsets)
+    return row
+
+def edit_dist_rows(x, y):
+    return int(last_row(x, y)[len(y)])
+
+def edit_dist_banded(x, y, k):
+    # If the distance is at most k, an optimal path never leaves
+    # the band of cells with |i - j| <= k, so we only compute the
+    # 2k + 1 cells of each row inside it, stored at t = j - i + k,
+    # and cap everything else at k + 1. If a whole row is above k,
+    # every path through it is too, and we can stop right there.
+    n, m = len(x), len(y)
+    if abs(n - m) > k:
+        return None
+    k = min(k, max(n, m))
+    xc, yc = as_code_pair(x, y)
+    dtype = table_dtype(3 * (k + 1), 0)
+    inf = k + 1
+    width = 2 * k + 1
+    offsets = np.arange(width, dtype=dtype)
+    # the cells only hold values up to k + 1, but the column indices
+    # go up to m, so those are kept in intp
+    cols = np.arange(width, dtype=np.intp) - k
+    # ypad[i + t] is y[j - 1] for the j at t in row i, or -1 when
+    # j is off either end of y
+    ypad = np.full(max(n, m) + 2 * k + 2, -1, dtype=np.int64)
+    ypad[k + 1:k + 1 + m] = yc
+
+    row = offsets - k # D[0, j] = j
+    row[row < 0] = inf
+    row[k + m + 1:] = inf
+    for i in range(1, n + 1):
+        j = cols + i # the j for each t in this row
+        up = np.empty_like(row)
+        up[:-1] = row[1:]
+        up[-1] = inf
+        cur = np.minimum(row + (ypad[i:i + width] != xc[i - 1]), up + 1)
+        cur -= offsets
+        np.minimum.accumulate(cur, out=cur)
+        cur += offsets
+        cur[(j < 0) | (j > m)] = inf
+        np.minimum(cur, inf, out=cur)
+        if cur.min() > k:
+            return None
+        row = cur
+    dist = int(row[m - n + k])
+    return dist if dist <= k else None
+
+def edit_dist(x, y, max_dist = None):
+    # Without a traceback we never need the full table. With a
+    # max_dist we only check if x and y are within that many
+    # edits; we get None if they are not.
+    if max_dist is None:
+        return edit_dist_rows(x, y)
+    return edit_dist_banded(x, y, max_dist)
+
+for a, b in [('', ''), ('', 'abc'), ('abc', ''), (x, y),
+             ('kitten', 'sitting'), ('acgtacgt', 'acgaacgtt')]:
+    D = loop_edit_table(a, b)
+    assert (build_edit_table(a, b) == D).all()
+    assert (build_edit_table(a, b, 'diagonals') == D).all()
+    assert edit_dist(a, b) == D[len(a), len(b)]
+    for k in range(4):
+        dist = edit_dist(a, b, max_dist=k)
+        assert dist == (D[len(a), len(b)] if D[len(a), len(b)] <= k else None)
+    print(a, b, edit_dist(a, b), backtrack(build_edit_table(a, b), a, b))
+
+# lists and tuples of tokens, as well as strings
+words = (['a', 'b'], ['a', 'c'])
+assert edit_dist(*words) == edit_dist(*words, max_dist=2) == 1
+assert (build_edit_table(*words) == loop_edit_table(*words)).all()
+assert edit_dist(('x', 'y', 'z'), 'xz') == 1
+
+# rows past 2^15 with a small band, whose cells fit in int16
+a = 'acgt' * 10**4
+assert edit_dist(a, a, max_dist=3) == 0
+assert edit_dist(a, a[:20000] + 'x' + a[20000:], max_dist=3) == 1
+assert edit_dist(a, a[:-5], max_dist=3) is None
+
+
+
+## Linear space alignment (Hirschberg)
+# The last row of the table for x[:mid] against y gives the cost
+# of aligning x[:mid] with every prefix y[:j], and the last row for
+# the reversed x[mid:] against the reversed y gives the cost of
+# aligning x[mid:] with every suffix y[j:]. An optimal alignment
+# splits y at the j that minimises the sum, so we can solve the two
+# halves independently and only ever keep a few rows in memory.
+# We keep the subproblems on an explicit stack rather than recurse,
+# and once a subproblem is small we build its (small) table and
+# backtrack through it with a loop.
+
+def backtrack_iter(D, x, y):
+    # the same choices as backtrack_, but with a loop
+    i, j = len(x), len(y)
+    path = []
+    while i > 0 and j > 0:
+        left = D[i, j - 1] + 1
+        diag = D[i - 1, j - 1] + int(x[i - 1] != y[j - 1])
+        up = D[i - 1, j] + 1
+
+        dist = left
+        op = 'D'
+        if diag < dist:
+            op = 'X' if x[i - 1] != y[j - 1] else '='
+            dist = diag
+        if up < dist:
+            op = 'I'
+
+        path.append(op)
+        if op in ('D', '=', 'X'):
+            j -= 1
+        if op in ('I', '=', 'X'):
+            i -= 1
+    path.extend('D' * j)
+    path.extend('I' * i)
+    path.reverse()
+    return ''.join(path)
+
+def hirschberg(x, y, small = 2**16):
+    xc, yc = as_code_pair(x, y)
+    pieces = []
+    stack = [(0, len(xc), 0, len(yc))]
+    while stack:
+        xlow, xhigh, ylow, yhigh = stack.pop()
+        a, b = xc[xlow:xhigh], yc[ylow:yhigh]
+        n, m = len(a), len(b)
+        if n <= 1 or (n + 1) * (m + 1) <= small:
+            pieces.append(backtrack_iter(build_edit_table(a, b), a, b))
+            continue
+        mid = n // 2
+        forward = last_row(a[:mid], b).astype(np.int64)
+        backward = last_row(a[mid:][::-1], b[::-1]).astype(np.int64)
+        split = int(np.argmin(forward + backward[::-1]))
+        # pop the left half first, so pieces come out in order
+        stack.append((xlow + mid, xhigh, ylow + split, yhigh))
+        stack.append((xlow, xlow + mid, ylow, ylow + split))
+    return ''.join(pieces)
+
+def alignment_cost(path):
+    return sum(op != '=' for op in path)
+
+def apply_alignment(path, x, y):
+    # check that path really is an alignment of x and y
+    i = j = 0
+    for op in path:
+        if op == '=': assert x[i] == y[j]
+        if op == 'X': assert x[i] != y[j]
+        if op in ('=', 'X', 'I'): i += 1
+        if op in ('=', 'X', 'D'): j += 1
+    assert i == len(x) and j == len(y)
+
+for a, b in [('', ''), ('', 'abc'), ('abc', ''), (x, y),
+             ('kitten', 'sitting'), ('acgtacgt', 'acgaacgtt')]:
+    assert hirschberg(a, b) == backtrack(build_edit_table(a, b), a, b)
+    path = hirschberg(a, b, small=1)
+    apply_alignment(path, a, b)
+    assert alignment_cost(path) == edit_dist(a, b)
+    print(a, b, path)
+assert hirschberg(['to', 'be', 'or'], ['to', 'or']) == '=I='
+
+
+
+## Batches of pairs
+# To compute distances between many pairs, we split the query
+# strings into blocks of rows and hand the blocks to a pool of
+# worker processes. All strings are packed into one array of
+# character codes in shared memory, so the workers read them from
+# there instead of getting a pickled copy with every task; a task
+# is just a range of rows. Blocks are yielded as they finish.
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+from os import cpu_count
+
+def pack_strings(strings):
+    codes = [c.astype(np.uint32) for c in as_code_list(strings)]
+    offsets = np.zeros(len(codes) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(c) for c in codes])
+    packed = np.concatenate(codes) if codes else np.zeros(0, np.uint32)
+    return packed, offsets
+
+worker_data = {}
+
+def init_worker(name, size, offsets, nq, max_dist):
+    shm = shared_memory.SharedMemory(name=name)
+    worker_data['shm'] = shm # the buffer lives as long as shm does
+    worker_data['codes'] = np.ndarray((size,), dtype=np.uint32, buffer=shm.buf)
+    worker_data['offsets'] = offsets
+    worker_data['nq'] = nq
+    worker_data['max_dist'] = max_dist
+
+def distance_block(low, high, symmetric):
+    codes = worker_data['codes']
+    offsets = worker_data['offsets']
+    nq, max_dist = worker_data['nq'], worker_data['max_dist']
+    if symmetric:
+        refs = range(nq)
+    else:
+        refs = range(nq, len(offsets) - 1)
+    block = np.full((high - low, len(refs)), np.inf)
+    for i in range(low, high):
+        x = codes[offsets[i]:offsets[i + 1]]
+        for col, j in enumerate(refs):
+            if symmetric and j <= i:
+                continue # the lower triangle is filled in by the caller
+            y = codes[offsets[j]:offsets[j + 1]]
+            dist = edit_dist(x, y, max_dist)
+            if dist is not None:
+                block[i - low, col] = dist
+    return low, high, block
+
+def iter_batch_edit_dist(queries, refs = None, max_dist = None,
+                         workers = None, rows_per_task = None):
+    # Yields (low, high, block) with the distances from
+    # queries[low:high] to all of refs (or to all of queries if
+    # refs is None, where only the part above the diagonal is
+    # filled in) as blocks finish, in no particular order.
+    # Pairs further apart than max_dist get infinity.
+    symmetric = refs is None
+    strings = list(queries) if symmetric else list(queries) + list(refs)
+    nq = len(queries)
+    workers = workers or cpu_count() or 1
+    if rows_per_task is None:
+        rows_per_task = max(1, nq // (4 * workers))
+    packed, offsets = pack_strings(strings)
+    shm = shared_memory.SharedMemory(create=True, size=max(packed.nbytes, 1))
+    try:
+        np.ndarray(packed.shape, dtype=np.uint32, buffer=shm.buf)[:] = packed
+        with ProcessPoolExecutor(
+                max_workers=workers, initializer=init_worker,
+                initargs=(shm.name, len(packed), offsets, nq, max_dist)
+        ) as pool:
+            tasks = [pool.submit(distance_block, low,
+                                 min(low + rows_per_task, nq), symmetric)
+                     for low in range(0, nq, rows_per_task)]
+            for task in as_completed(tasks):
+                yield task.result()
+    finally:
+        shm.close()
+        shm.unlink()
+
+def batch_edit_dist(queries, refs = None, max_dist = None,
+                    workers = None, rows_per_task = None):
+    # The distance matrix as a numpy array, with queries as rows
+    # and refs (or queries again) as columns.
+    ncols = len(queries) if refs is None else len(refs)
+    D = np.full((len(queries), ncols), np.inf)
+    for low, high, block in iter_batch_edit_dist(
+            queries, refs, max_dist, workers, rows_per_task):
+        D[low:high] = block
+    if refs is None:
+        upper = np.triu(D, 1)
+        D = upper + upper.T
+    return D
+
+
+if __name__ == '__main__':
+    # Under the spawn start method every worker imports this file
+    # again, so the pools may only start here.
+    words = ['baz', 'fbar', 'kitten', 'sitting', 'acgt', '']
+    D = batch_edit_dist(words, workers=2)
+    for a, row in zip(words, D):
+        for b, dist in zip(words, row):
+            assert dist == edit_dist(a, b)
+    D = batch_edit_dist(words[:2], words, max_dist=3, workers=2)
+    for a, row in zip(words, D):
+        for b, dist in zip(words, row):
+            assert dist == (edit_dist(a, b, 3) if edit_dist(a, b, 3) is not None else np.inf)
+    print(D)
+    tokens = [['a', 'b'], ['a', 'c'], ('b',)]
+    assert (batch_edit_dist(tokens[:1], tokens[1:], workers=2) == [[1, 1]]).all()
+
+    from random import choice
+    from time import perf_counter
+    print("n algorithm seconds")
+    for n in (100, 1000, 10**4, 3 * 10**4):
+        a = ''.join(choice('acgt') for _ in range(n))
+        b = ''.join(choice('acgt') for _ in range(n))
+        runs = [('distance', lambda: edit_dist(a, b))]
+        if n <= 10**4:
+            runs.append(('rows', lambda: build_edit_table(a, b)))
+            runs.append(('diagonals', lambda: build_edit_table(a, b, 'diagonals')))
+        if n <= 100:
+            runs.append(('loop', lambda: loop_edit_table(a, b)))
+        runs.append(('hirschberg', lambda: hirschberg(a, b)))
+        runs.append(('banded k=10', lambda: edit_dist(a, b, max_dist=10)))
+        c = a[:n // 2] + 'x' + a[n // 2:]
+        runs.append(('banded k=10 close', lambda: edit_dist(a, c, max_dist=10)))
+        for name, run in runs:
+            start = perf_counter()
+            run()
+            print(n, name, round(perf_counter() - start, 3))
+
+    queries = [''.join(choice('acgt') for _ in range(200)) for _ in range(40)]
+    refs = [''.join(choice('acgt') for _ in range(200)) for _ in range(40)]
+    print("workers pairs seconds")
+    for workers in sorted({1, 2, 4, cpu_count() or 1}):
+        start = perf_counter()
+        batch_edit_dist(queries, refs, workers=workers)
+        print(workers, len(queries) * len(refs), round(perf_counter() - start, 3))
@@ -47,3 +47,20 @@ for i in range(1,11):
     count = 0
     tbl = {}
     print("{} {} {}".format(i, fib(i), count))
+
+# The same memoised fib, but with the table handled by a
+# decorator that also keeps count of hits and misses for us.
+from memoize import memoize
+
+@memoize(maxsize=100)
+def fib(n):
+    if n <= 1:
+        return 1
+    return fib(n - 1) + fib(n - 2)
+
+print("n fib hits misses evictions")
+for i in range(1,11):
+    fib.cache_clear()
+    val = fib(i)
+    info = fib.cache_info()
+    print("{} {} {} {} {}".format(i, val, info.hits, info.misses, info.evictions))
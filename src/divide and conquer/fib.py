@@ -37,3 +37,77 @@ def fib_dp(n):
 print("n fib count")
 for i in range(1,10):
     print("{} {} {}".format(i, fib(i), fib_dp(i)))
+
+# Like fib_dp, but we only ever need the last two numbers,
+# so we don't need a table of all n of them.
+def fib_iter(n):
+    fibn1, fibn = 1, 1
+    for i in range(n - 1):
+        fibn1, fibn = fibn, fibn + fibn1
+    return fibn
+
+# The matrix [[1, 1], [1, 0]] raised to the power k is
+# [[F(k+1), F(k)], [F(k), F(k-1)]] with the usual F(0) = 0, F(1) = 1,
+# and fib(n) here is F(n + 1). With repeated squaring we only need
+# O(log n) 2x2 matrix multiplications.
+def mat_mult(A, B):
+    (a, b), (c, d) = A
+    (e, f), (g, h) = B
+    return ((a * e + b * g, a * f + b * h),
+            (c * e + d * g, c * f + d * h))
+
+def fib_matrix(n):
+    result = ((1, 0), (0, 1))
+    power = ((1, 1), (1, 0))
+    k = n + 1
+    while k > 0:
+        if k & 1:
+            result = mat_mult(result, power)
+        power = mat_mult(power, power)
+        k >>= 1
+    return result[0][1]
+
+# Fast doubling needs fewer multiplications than the matrices:
+#   F(2k)     = F(k) * (2 F(k+1) - F(k))
+#   F(2k + 1) = F(k)^2 + F(k+1)^2
+# We run through the bits of n + 1 from the most significant,
+# doubling k for each bit and adding one when the bit is set.
+def fib_doubling(n):
+    a, b = 0, 1 # F(k), F(k+1) for k = 0
+    k = n + 1
+    for bit in bin(k)[2:]:
+        a, b = a * (2 * b - a), a * a + b * b
+        if bit == '1':
+            a, b = b, a + b
+    return a
+
+for i in range(0, 30):
+    assert fib_dp(i) == fib_iter(i) == fib_matrix(i) == fib_doubling(i)
+assert fib_iter(1000) == fib_matrix(1000) == fib_doubling(1000)
+
+print("n fib_iter fib_matrix fib_doubling")
+for i in range(1,10):
+    print("{} {} {} {}".format(i, fib_iter(i), fib_matrix(i), fib_doubling(i)))
+
+
+if __name__ == '__main__':
+    import tracemalloc
+    from time import perf_counter
+    print("n algorithm seconds peak_bytes")
+    variants = [
+        ('fib', fib, 25),
+        ('fib_dp', fib_dp, 2 * 10**4),
+        ('fib_iter', fib_iter, 10**6),
+        ('fib_matrix', fib_matrix, 10**6),
+        ('fib_doubling', fib_doubling, 10**6),
+    ]
+    for n in (20, 10**3, 10**4, 10**5, 10**6):
+        for name, f, largest in variants:
+            if n > largest: continue
+            tracemalloc.start()
+            start = perf_counter()
+            f(n)
+            seconds = perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(n, name, round(seconds, 4), peak)
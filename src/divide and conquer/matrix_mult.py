@@ -1,11 +1,111 @@
+import numpy as np
+
 ks = [2,5,3,6,8,3]
 
-## FIXME: something doesn't work here.
- 
+# Matrix t has dimensions ks[t] x ks[t + 1], so ks describes
+# len(ks) - 1 matrices, and cost(i, j) is the smallest number of
+# scalar multiplications needed to multiply matrices i to j - 1.
+# Splitting at k, we first compute the ks[i] x ks[k] product of
+# matrices i to k - 1 and the ks[k] x ks[j] product of k to j - 1,
+# so k runs from i + 1 to j - 1, both included. A single matrix
+# costs nothing. Without memoisation, we would solve the same
+# subproblems an exponential number of times.
+
+from memoize import memoize
+
+@memoize
 def cost(i,j):
-    print("called with (", i, j, ")")
-    if j <= i + 1: return 1
+    if j <= i + 1: return 0
     return min(cost(i,k) + cost(k,j) + ks[i] * ks[k] * ks[j]
-    for k in range(i+1,j-1))
+               for k in range(i+1,j))
+
+print("min cost:", cost(0,len(ks)-1))
+print(cost.cache_info())
+
+
+## Bottom-up
+# Fill in the costs for increasing lengths j - i, so the
+# subproblems are always ready when we need them, and remember the
+# best split in S[i,j]. We store the costs by start and length,
+# L[i,l] = C[i,i+l], because then all splits of all intervals of
+# the same length are one vectorised expression: splitting [i,i+l)
+# at i+s costs L[i,s] + L[i+s,l-s] plus the final product. That is
+# what makes chains of hundreds of matrices fast to plan.
+
+def chain_order(ks):
+    n = len(ks) - 1
+    dims = np.array(ks, dtype=np.int64)
+    L = np.zeros((n + 1, n + 1), dtype=np.int64)
+    S = np.zeros((n + 1, n + 1), dtype=np.int64)
+    for length in range(2, n + 1):
+        i = np.arange(n - length + 1)[:,None]
+        s = np.arange(1, length)[None,:]
+        splits = (L[i,s] + L[i+s,length-s]
+                  + dims[i] * dims[i+s] * dims[i+length])
+        best = np.argmin(splits, axis=1)
+        i = i[:,0]
+        L[i,length] = splits[i,best]
+        S[i,i+length] = i + 1 + best
+    # back to C[i,j], the cost of multiplying matrices i to j - 1
+    C = np.zeros((n + 1, n + 1), dtype=np.int64)
+    for i in range(n + 1):
+        C[i,i:] = L[i,:n + 1 - i]
+    return C, S
+
+def split_tree(S, i, j):
+    # the tree as nested pairs, with matrix indices in the leaves
+    if j == i + 1: return i
+    k = S[i,j]
+    return (split_tree(S, i, k), split_tree(S, k, j))
+
+def parenthesise(tree):
+    if isinstance(tree, tuple):
+        return "(" + parenthesise(tree[0]) + " " + parenthesise(tree[1]) + ")"
+    return "A{}".format(tree)
+
+def chain_product(matrices, tree):
+    if isinstance(tree, tuple):
+        return chain_product(matrices, tree[0]) @ chain_product(matrices, tree[1])
+    return matrices[tree]
+
+def multiply_chain(matrices):
+    ks = [matrices[0].shape[0]] + [A.shape[1] for A in matrices]
+    C, S = chain_order(ks)
+    return chain_product(matrices, split_tree(S, 0, len(matrices)))
+
+def left_to_right(matrices):
+    result = matrices[0]
+    for A in matrices[1:]:
+        result = result @ A
+    return result
+
+C, S = chain_order(ks)
+print("min cost:", C[0,len(ks)-1])
+print(parenthesise(split_tree(S, 0, len(ks)-1)))
+assert C[0,len(ks)-1] == cost(0,len(ks)-1)
+for i in range(len(ks)):
+    for j in range(i, len(ks)):
+        assert C[i,j] == cost(i,j)
+
+matrices = [np.random.rand(ks[t], ks[t+1]) for t in range(len(ks)-1)]
+assert np.allclose(multiply_chain(matrices), left_to_right(matrices))
+
 
-print("min cost:", cost(0,len(ks)))
+if __name__ == '__main__':
+    from time import perf_counter
+    print("matrices planning multiply left-to-right")
+    for n in (10, 100, 300):
+        ks = list(np.random.randint(1, 200, size=n + 1))
+        start = perf_counter()
+        C, S = chain_order(ks)
+        tree = split_tree(S, 0, n)
+        planning = perf_counter() - start
+        # scaled so the entries of the product stay around one
+        matrices = [np.random.rand(ks[t], ks[t+1]) / ks[t] for t in range(n)]
+        start = perf_counter()
+        chain_product(matrices, tree)
+        optimal = perf_counter() - start
+        start = perf_counter()
+        left_to_right(matrices)
+        naive = perf_counter() - start
+        print(n, round(planning, 4), round(optimal, 4), round(naive, 4))
@@ -0,0 +1,126 @@
+from collections import OrderedDict, namedtuple
+from functools import wraps
+from threading import Lock
+
+# A memoisation decorator with a bound on the cache size. The cache
+# is an OrderedDict in least recently used order: a hit moves the key
+# to the end, and when the cache is full we evict from the front.
+# Every decorated function gets its own counters, so we can see if
+# the cache is paying off, and cache_clear() to reset it between
+# runs instead of resetting a global table by hand.
+#
+# With thread_safe=True, all cache updates happen under a lock. We
+# don't hold the lock while calling the function itself, since that
+# would serialise all calls and the recursive calls would deadlock;
+# two threads may then compute the same value, but the cache stays
+# consistent.
+
+# Keyword arguments go in the key after a marker, so f(1, b=2) and a
+# call that passes the same tuples positionally get different keys.
+kwd_mark = object()
+
+CacheInfo = namedtuple('CacheInfo',
+                       ['hits', 'misses', 'evictions', 'maxsize', 'size'])
+
+def memoize(maxsize = None, thread_safe = False):
+    if callable(maxsize): # used as @memoize without arguments
+        return memoize()(maxsize)
+
+    def decorator(f):
+        cache = OrderedDict()
+        stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+        lock = Lock() if thread_safe else None
+
+        def lookup(key):
+            if key in cache:
+                cache.move_to_end(key)
+                stats['hits'] += 1
+                return True, cache[key]
+            stats['misses'] += 1
+            return False, None
+
+        def store(key, value):
+            cache[key] = value
+            cache.move_to_end(key)
+            if maxsize is not None and len(cache) > maxsize:
+                cache.popitem(last=False)
+                stats['evictions'] += 1
+
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            key = args if not kwargs else args + (kwd_mark,) + tuple(sorted(kwargs.items()))
+            if lock is None:
+                found, value = lookup(key)
+            else:
+                with lock:
+                    found, value = lookup(key)
+            if found:
+                return value
+            value = f(*args, **kwargs)
+            if lock is None:
+                store(key, value)
+            else:
+                with lock:
+                    store(key, value)
+            return value
+
+        def cache_info():
+            return CacheInfo(stats['hits'], stats['misses'],
+                             stats['evictions'], maxsize, len(cache))
+
+        def cache_clear():
+            if lock is None:
+                reset()
+            else:
+                with lock:
+                    reset()
+
+        def reset():
+            cache.clear()
+            for counter in stats:
+                stats[counter] = 0
+
+        wrapper.cache_info = cache_info
+        wrapper.cache_clear = cache_clear
+        return wrapper
+
+    return decorator
+
+
+if __name__ == '__main__':
+    @memoize
+    def fib(n):
+        if n <= 1:
+            return 1
+        return fib(n - 1) + fib(n - 2)
+
+    @memoize(maxsize=2)
+    def fib_small(n):
+        if n <= 1:
+            return 1
+        return fib_small(n - 1) + fib_small(n - 2)
+
+    @memoize(maxsize=100, thread_safe=True)
+    def factorial(n):
+        if n == 1:
+            return 1
+        else:
+            return n * factorial(n - 1)
+
+    print(fib(30), fib.cache_info())
+    print(fib_small(30), fib_small.cache_info())
+    print(factorial(10), factorial.cache_info())
+    print(factorial(200) // factorial(199), factorial.cache_info())
+
+    from concurrent.futures import ThreadPoolExecutor
+    factorial.cache_clear()
+    with ThreadPoolExecutor(4) as pool:
+        results = list(pool.map(factorial, range(1, 300)))
+    assert all(results[n] == (n + 1) * results[n - 1] for n in range(1, 299))
+    print(factorial.cache_info())
+
+    @memoize
+    def f(*args, **kwargs):
+        return args, kwargs
+    assert f(1, b=2) == ((1,), {'b': 2})
+    assert f((1,), (('b', 2),)) == (((1,), (('b', 2),)), {})
@@ -75,3 +75,373 @@ for elm in y:
         intersection.append(elm)
 
 print(intersection)
+
+
+
+## Intersections, unions and differences of large collections
+# Which of the three ways above is best depends on the input. If both
+# collections are sorted, a merge that walks through them side by
+# side is linear and needs no extra memory. If one of them is much
+# smaller, we don't even have to look at all of the larger one: for
+# each element of the smaller we gallop forward in the larger,
+# checking 1, 2, 4, ... positions ahead and then doing a binary
+# search in the last gap, so the cost grows with the size of the
+# smaller collection and only logarithmically with the larger. If
+# they are not sorted, putting one of them in a hash table, a set,
+# makes each membership test constant time, which beats sorting
+# them first.
+#
+# The collections are sets of distinct elements given as lists,
+# tuples or numpy arrays. For sorted inputs, the results are sorted;
+# otherwise the intersection and difference keep the order of x and
+# the union is x followed by what is new in y. For numpy arrays the
+# merges happen in C: a stable sort of two sorted arrays put end to
+# end is a single timsort merge, and np.searchsorted does galloping
+# in one call for all the elements. Unsorted arrays we sort first,
+# so numpy results are always sorted. Long lists of ints, such as
+# lists of ids, we copy into arrays and the result back into a list,
+# which is several times faster than merging or hashing them in
+# Python; their results are sorted too. If stats is a dict, we
+# record what we found and the method we picked in it.
+
+import numpy as np
+from bisect import bisect_left
+from operator import gt, countOf
+from itertools import islice
+from heapq import merge
+
+gallop_ratio = 32 # gallop when one side is this many times larger
+numpy_from = 1000 # lists of ints at least this long we hand to numpy
+
+def is_sorted(x):
+    if isinstance(x, np.ndarray):
+        return bool(np.all(x[:-1] <= x[1:]))
+    return countOf(map(gt, x, islice(x, 1, None)), True) == 0
+
+def as_ids(x):
+    # A long list of ints as an int64 array, or None.
+    if len(x) < numpy_from or set(map(type, x)) != {int}:
+        return None
+    try:
+        return np.fromiter(x, dtype=np.int64, count=len(x))
+    except OverflowError:
+        return None
+
+def plan(x, y, stats):
+    # Returns the method and the collections to use it on. If we use
+    # numpy, they are sorted arrays.
+    if isinstance(x, np.ndarray) or isinstance(y, np.ndarray):
+        x, y, use_numpy = np.asarray(x), np.asarray(y), True
+    else:
+        a, b = as_ids(x), as_ids(y)
+        use_numpy = a is not None and b is not None
+        if use_numpy:
+            x, y = a, b
+    x_sorted, y_sorted = is_sorted(x), is_sorted(y)
+    small, large = sorted((len(x), len(y)))
+    if use_numpy or (x_sorted and y_sorted):
+        method = 'gallop' if small * gallop_ratio < large else 'merge'
+    else:
+        method = 'hash'
+    if stats is not None:
+        stats.update(x_size=len(x), y_size=len(y), x_sorted=x_sorted,
+                     y_sorted=y_sorted, numpy=use_numpy, method=method)
+    if use_numpy:
+        x = x if x_sorted else np.sort(x)
+        y = y if y_sorted else np.sort(y)
+    return method, x, y, use_numpy
+
+def gallop(x, e, low = 0):
+    # the first index i >= low with x[i] >= e, x sorted
+    step, high = 1, low
+    while high < len(x) and x[high] < e:
+        low = high + 1
+        high += step
+        step *= 2
+    return bisect_left(x, e, low, min(high, len(x)))
+
+def merge_intersection(x, y):
+    result = []
+    i, j = 0, 0
+    while i < len(x) and j < len(y):
+        if x[i] < y[j]:
+            i += 1
+        elif y[j] < x[i]:
+            j += 1
+        else:
+            result.append(x[i])
+            i += 1
+            j += 1
+    return result
+
+def merge_union(x, y):
+    result = []
+    i, j = 0, 0
+    while i < len(x) and j < len(y):
+        if x[i] < y[j]:
+            result.append(x[i])
+            i += 1
+        elif y[j] < x[i]:
+            result.append(y[j])
+            j += 1
+        else:
+            result.append(x[i])
+            i += 1
+            j += 1
+    result.extend(x[i:])
+    result.extend(y[j:])
+    return result
+
+def merge_difference(x, y):
+    result = []
+    i, j = 0, 0
+    while i < len(x) and j < len(y):
+        if x[i] < y[j]:
+            result.append(x[i])
+            i += 1
+        elif y[j] < x[i]:
+            j += 1
+        else:
+            i += 1
+            j += 1
+    result.extend(x[i:])
+    return result
+
+def gallop_positions(small, large):
+    # for each element of small, where it is or would go in large
+    positions = []
+    i = 0
+    for e in small:
+        i = gallop(large, e, i)
+        positions.append(i)
+    return positions
+
+def found_in(large, small, positions):
+    return [i < len(large) and large[i] == e for e, i in zip(small, positions)]
+
+def gallop_intersection(x, y):
+    small, large = (x, y) if len(x) <= len(y) else (y, x)
+    positions = gallop_positions(small, large)
+    return [e for e, hit in zip(small, found_in(large, small, positions)) if hit]
+
+def gallop_difference(x, y):
+    if len(x) <= len(y):
+        positions = gallop_positions(x, y)
+        return [e for e, hit in zip(x, found_in(y, x, positions)) if not hit]
+    # y is the small one: copy x in slices around the elements of y
+    positions = gallop_positions(y, x)
+    result, start = [], 0
+    for i, hit in zip(positions, found_in(x, y, positions)):
+        if hit:
+            result.extend(x[start:i])
+            start = i + 1
+    result.extend(x[start:])
+    return result
+
+def numpy_output(result, x, y):
+    # lists in, list out
+    if isinstance(x, np.ndarray) or isinstance(y, np.ndarray):
+        return result
+    return result.tolist()
+
+def numpy_found(large, small):
+    positions = np.searchsorted(large, small)
+    found = positions < len(large)
+    found[found] = large[positions[found]] == small[found]
+    return positions, found
+
+def merged(x, y):
+    both = np.concatenate((x, y))
+    both.sort(kind='stable')
+    return both
+
+def numpy_intersection(x, y, method):
+    if method == 'gallop':
+        small, large = (x, y) if len(x) <= len(y) else (y, x)
+        return small[numpy_found(large, small)[1]]
+    both = merged(x, y)
+    return both[:-1][both[1:] == both[:-1]]
+
+def numpy_union(x, y, method):
+    if method == 'gallop':
+        small, large = (x, y) if len(x) <= len(y) else (y, x)
+        positions, found = numpy_found(large, small)
+        return np.insert(large, positions[~found], small[~found])
+    both = merged(x, y)
+    keep = np.ones(len(both), dtype=bool)
+    keep[1:] = both[1:] != both[:-1]
+    return both[keep]
+
+def numpy_difference(x, y, method):
+    if method == 'gallop' and len(y) < len(x):
+        positions, found = numpy_found(x, y)
+        return np.delete(x, positions[found])
+    return x[~numpy_found(y, x)[1]]
+
+def intersection(x, y, stats = None):
+    method, a, b, use_numpy = plan(x, y, stats)
+    if use_numpy:
+        return numpy_output(numpy_intersection(a, b, method), x, y)
+    if method == 'hash':
+        ys = set(y)
+        return [e for e in x if e in ys]
+    if method == 'gallop':
+        return gallop_intersection(x, y)
+    return merge_intersection(x, y)
+
+def union(x, y, stats = None):
+    method, a, b, use_numpy = plan(x, y, stats)
+    if use_numpy:
+        return numpy_output(numpy_union(a, b, method), x, y)
+    if method == 'hash':
+        xs = set(x)
+        return list(x) + [e for e in y if e not in xs]
+    # the output is as large as the inputs, so galloping saves nothing
+    return merge_union(x, y)
+
+def difference(x, y, stats = None):
+    method, a, b, use_numpy = plan(x, y, stats)
+    if use_numpy:
+        return numpy_output(numpy_difference(a, b, method), x, y)
+    if method == 'hash':
+        ys = set(y)
+        return [e for e in x if e not in ys]
+    if method == 'gallop':
+        return gallop_difference(x, y)
+    return merge_difference(x, y)
+
+def intersect_all(collections, stats = None):
+    # Smallest first: the intersection so far only gets smaller, so
+    # later steps can gallop through the larger collections.
+    # The intersection of no collections would be everything, which
+    # we can't return.
+    collections = sorted(collections, key=len)
+    if not collections:
+        raise ValueError("intersect_all needs at least one collection")
+    result = collections[0]
+    methods = []
+    for c in collections[1:]:
+        step = {}
+        result = intersection(result, c, step)
+        methods.append(step['method'])
+    if stats is not None:
+        stats['methods'] = methods
+    return result
+
+
+## Streaming
+# Sorted iterators, for collections that don't fit in memory, or
+# that we produce as we go. For the intersection, each iterator in
+# turn skips ahead to the largest element seen so far; when they all
+# stop at the same element, it is in all of them.
+
+def stream_intersection(*iterables):
+    if not iterables:
+        raise ValueError("stream_intersection needs at least one iterable")
+    iterators = [iter(it) for it in iterables]
+    try:
+        current = [next(it) for it in iterators]
+        high = max(current)
+        while True:
+            agree = True
+            for k, it in enumerate(iterators):
+                e = current[k]
+                while e < high:
+                    e = next(it)
+                current[k] = e
+                if high < e:
+                    high, agree = e, False
+            if agree:
+                yield high
+                current = [next(it) for it in iterators]
+                high = max(current)
+    except StopIteration: # one of them ran out
+        return
+
+def stream_union(*iterables):
+    last = sentinel = object()
+    for e in merge(*iterables):
+        if last is sentinel or last != e:
+            yield e
+        last = e
+
+def stream_difference(x, y):
+    y = iter(y)
+    sentinel = object()
+    current = next(y, sentinel)
+    for e in x:
+        while current is not sentinel and current < e:
+            current = next(y, sentinel)
+        if current is sentinel or e != current:
+            yield e
+
+
+x = ['Peter', 'Paul', 'James']
+y = ['Paul', 'James', 'Mark']
+stats = {}
+print(intersection(x, y, stats), stats['method'])
+print(intersection(sorted(x), sorted(y), stats), stats['method'])
+print(union(x, y), difference(x, y), difference(sorted(x), sorted(y)))
+print(list(stream_intersection(sorted(x), sorted(y), ['James', 'Paul'])))
+
+from random import sample, randrange
+for n, m in ((0, 5), (5, 0), (10, 10), (100, 70), (1000, 10), (3, 500), (2000, 1500)):
+    x, y = sample(range(2 * n + m), n), sample(range(2 * n + m), m)
+    xs, ys = sorted(x), sorted(y)
+    for a, b in ((x, y), (xs, ys), (np.array(x, dtype=int), np.array(y, dtype=int)),
+                 (np.array(xs, dtype=int), ys)):
+        assert sorted(intersection(a, b)) == sorted(set(x) & set(y))
+        assert sorted(union(a, b)) == sorted(set(x) | set(y))
+        assert sorted(difference(a, b)) == sorted(set(x) - set(y))
+        assert sorted(difference(b, a)) == sorted(set(y) - set(x))
+    assert intersection(xs, ys) == sorted(set(x) & set(y))
+    assert union(xs, ys) == sorted(set(x) | set(y))
+    assert difference(ys, xs) == sorted(set(y) - set(x))
+    if min(n, m) < numpy_from:
+        assert intersection(x, y) == [e for e in x if e in set(y)]
+    else:
+        assert intersection(x, y) == sorted(set(x) & set(y))
+    assert list(stream_intersection(xs, iter(ys))) == sorted(set(x) & set(y))
+    assert list(stream_union(xs, ys)) == sorted(set(x) | set(y))
+    assert list(stream_difference(xs, iter(ys))) == sorted(set(x) - set(y))
+groups = [sorted(set(sample(range(300), randrange(1, 300))) | {7, 100, 200})
+          for _ in range(4)] + [[7, 100, 200, 301]]
+stats = {}
+common = sorted(set.intersection(*map(set, groups)))
+assert intersect_all(groups, stats) == common
+assert list(stream_intersection(*groups)) == common
+print(common, stats['methods'])
+for empty in (lambda: intersect_all([]), lambda: list(stream_intersection())):
+    try:
+        empty()
+    except ValueError as error:
+        print(error)
+
+
+if __name__ == '__main__':
+    from time import perf_counter
+    rng = np.random.default_rng(1)
+    n = 10**7
+    def ids(n):
+        return np.unique(rng.integers(0, 2**31, size=int(n * 1.01)))[:n]
+    a, b = ids(n), ids(n)
+    few = np.sort(rng.choice(b, size=1000, replace=False))
+    shuffled = rng.permutation(a), rng.permutation(b)
+    print("operation x y method seconds")
+    for name, op in (('intersection', intersection), ('union', union),
+                     ('difference', difference)):
+        for x, y in ((a, b), (a, few), shuffled):
+            stats = {}
+            start = perf_counter()
+            op(x, y, stats)
+            seconds = perf_counter() - start
+            print(name, len(x), len(y), stats['method'], round(seconds, 3))
+    la, lb = a.tolist(), b.tolist()
+    for name, x, y in (('lists', la, lb), ('shuffled_lists', la[::-1], lb)):
+        stats = {}
+        start = perf_counter()
+        intersection(x, y, stats)
+        print(name, len(x), len(y), stats['method'], round(perf_counter() - start, 3))
+    start = perf_counter()
+    common = sum(1 for _ in stream_intersection(iter(la), iter(lb)))
+    print("stream_intersection", len(la), len(lb), "leapfrog", round(perf_counter() - start, 3))
@@ -0,0 +1,210 @@
+
+## Counting what a sort does
+# In quadraitic-sort-comparison.py every sort counts its own
+# comparisons and swaps, so we have to edit a sort to see what it
+# does. Instead, we can give a sort elements and a sequence that do
+# the counting:
+#   - a Key wraps an element and counts every comparison with it;
+#   - a CountingSequence wraps a list, an array.array or anything
+#     else with indexing, and counts the elements read and written,
+#     and the swaps, two writes that exchange two elements.
+# A sort that only compares elements and indexes the sequence then
+# reports everything it does, without knowing it. Sorts that do
+# arithmetic on the keys, like radix sort, get plain keys in a
+# counting sequence.
+#
+# Wrapping every element makes every comparison a Python call. With
+# rate < 1, we only wrap each element with probability rate, and
+# comparisons between two plain elements run at full speed and are
+# not counted. Which elements the sort compares doesn't depend on
+# which ones we wrapped, so every comparison is seen with the same
+# probability, 1 - (1 - rate)^2, and dividing the count by that
+# gives an unbiased estimate. The sequence has no such trick; every
+# read and write goes through it and is counted.
+
+import sys, io, contextlib
+from random import Random
+from loader import load
+
+class Counts:
+	__slots__ = ('comparisons', 'reads', 'writes', 'swaps', 'rate')
+
+	def __init__(self, rate = 1.0):
+		self.comparisons = self.reads = self.writes = self.swaps = 0
+		self.rate = rate
+
+	def estimate(self):
+		seen = 1 - (1 - self.rate)**2
+		return {'comparisons': round(self.comparisons / seen),
+				'reads': self.reads, 'writes': self.writes, 'swaps': self.swaps}
+
+class Key:
+	# The other side of a comparison can be a Key or a plain element;
+	# if only the right side is a Key, Python calls its reflected
+	# method, so we still see the comparison once.
+	__slots__ = ('key', 'counts')
+
+	def __init__(self, key, counts):
+		self.key, self.counts = key, counts
+
+	def __lt__(self, other):
+		self.counts.comparisons += 1
+		return self.key < (other.key if type(other) is Key else other)
+
+	def __gt__(self, other):
+		self.counts.comparisons += 1
+		return self.key > (other.key if type(other) is Key else other)
+
+	def __le__(self, other):
+		self.counts.comparisons += 1
+		return self.key <= (other.key if type(other) is Key else other)
+
+	def __ge__(self, other):
+		self.counts.comparisons += 1
+		return self.key >= (other.key if type(other) is Key else other)
+
+	def __eq__(self, other):
+		self.counts.comparisons += 1
+		return self.key == (other.key if type(other) is Key else other)
+
+	def __hash__(self):
+		return hash(self.key)
+
+	def __repr__(self):
+		return repr(self.key)
+
+def unwrap(e):
+	return e.key if type(e) is Key else e
+
+class CountingSequence:
+	# Slices are counting sequences too, sharing the counts, so sorts
+	# that copy their input with x[:] are still counted. A swap is a
+	# write of v over u followed by a write of u where v was.
+	def __init__(self, data, counts):
+		self.data, self.counts = data, counts
+		self.pending = None
+
+	def __len__(self):
+		return len(self.data)
+
+	def __getitem__(self, i):
+		if isinstance(i, slice):
+			part = self.data[i]
+			self.counts.reads += len(part)
+			return CountingSequence(part, self.counts)
+		self.counts.reads += 1
+		return self.data[i]
+
+	def __setitem__(self, i, v):
+		if isinstance(i, slice):
+			if isinstance(v, CountingSequence):
+				v = v.data
+			self.data[i] = v
+			self.counts.writes += len(self.data[i])
+			return
+		self.counts.writes += 1
+		old = self.data[i]
+		if self.pending is not None and v is self.pending[1] and old is self.pending[0]:
+			self.counts.swaps += 1
+			self.pending = None
+		else:
+			self.pending = (v, old)
+		self.data[i] = v
+
+	def __iter__(self):
+		for e in self.data:
+			self.counts.reads += 1
+			yield e
+
+	def __copy__(self):
+		# the scratch buffers of merge sort are copies of the input
+		self.counts.reads += len(self.data)
+		self.counts.writes += len(self.data)
+		return CountingSequence(self.data[:], self.counts)
+
+	def __getattr__(self, name):
+		# typecode, itemsize and the like, for array.array
+		return getattr(self.data, name)
+
+	def __repr__(self):
+		return 'CountingSequence({!r})'.format(self.data)
+
+def instrument(sort, x, rate = 1.0, keys = True, seed = None):
+	# Sorts a copy of the list x with sort, which either sorts in
+	# place or returns the sorted sequence, and returns the sorted
+	# elements and the (estimated) counts. With keys=False, the
+	# elements are not wrapped and we only count reads and writes.
+	counts = Counts(rate if keys else 1.0)
+	if keys:
+		if rate >= 1:
+			x = [Key(e, counts) for e in x]
+		else:
+			coin = Random(seed).random
+			x = [Key(e, counts) if coin() < rate else e for e in x]
+	else:
+		x = x[:]
+	seq = CountingSequence(x, counts)
+	result = sort(seq)
+	if result is None:
+		result = seq
+	if isinstance(result, CountingSequence):
+		result = result.data
+	if keys:
+		result = [unwrap(e) for e in result]
+	return result, counts.estimate()
+
+
+if __name__ == '__main__':
+	from array import array
+	from random import sample
+	from time import perf_counter
+
+	quadratic = load('quadraitic-sort-comparison.py')
+	merge = load('merge-sort.py')
+	radix = load('radix-sort.py')
+	try:
+		heap = load('heapify.py')
+	except AssertionError:
+		# heapify.py's own checks fail, but heapify is defined by then
+		heap = sys.modules['heapify']
+
+	x = sample(range(1000), 200)
+	for name in ('selection', 'insertion', 'bubble', 'cocktail'):
+		with contextlib.redirect_stdout(io.StringIO()):
+			result, counts = instrument(getattr(quadratic, name + '_sort'), x)
+		assert result == sorted(x)
+		# The sorts count their own swaps, so we can check ours. Their
+		# comparison counts are a little off: selection sort doesn't
+		# count x[i] > min_val, and insertion sort counts one when the
+		# loop stops at j == 0 without comparing.
+		own_comparisons, own_swaps = quadratic.last_counts[name]
+		assert counts['swaps'] == own_swaps
+		assert abs(counts['comparisons'] - own_comparisons) <= len(x)
+		print(name, counts)
+
+	for name, sort in (('merge_sort', merge.merge_sort),
+					   ('list_merge_sort', merge.list_merge_sort),
+					   ('merge_sort_alternate', merge.merge_sort_alternate),
+					   ('merge_sort_natural', merge.merge_sort_natural),
+					   ('sorted', sorted)):
+		result, counts = instrument(sort, x)
+		assert result == sorted(x), name
+		print(name, counts)
+
+	result, counts = instrument(radix.radix_sort, array('l', x), keys=False)
+	assert list(result) == sorted(x)
+	print('radix_sort', counts)
+
+	with contextlib.redirect_stdout(io.StringIO()):
+		result, counts = instrument(lambda y: heap.heapify(y, 0, 0), x)
+	print('heapify', counts)
+
+	# sampling: the estimate is close, and the overhead much smaller
+	n = 10**5
+	x = sample(range(n), n)
+	print("rate seconds comparisons")
+	for rate in (1.0, 0.1, 0.01, 0.0):
+		start = perf_counter()
+		_, counts = instrument(sorted, x, rate, seed=1) if rate else (sorted(x), None)
+		print(rate, round(perf_counter() - start, 3),
+			  counts['comparisons'] if counts else None)
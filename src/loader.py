@@ -0,0 +1,21 @@
+import os, sys, io, contextlib
+import importlib.util
+
+def load(path):
+	# The scripts have hyphens in their names and print things when
+	# they run, so we load them as modules by path with the output
+	# thrown away. The module is registered in sys.modules before it
+	# runs, so its functions can be pickled by name. Processes started
+	# by fork inherit the registration, but processes started by
+	# spawn, the default on macOS and Windows, import modules by name
+	# and can't find it.
+	here = os.path.dirname(os.path.abspath(__file__))
+	name = os.path.basename(path)[:-3].replace('-', '_')
+	if name in sys.modules:
+		return sys.modules[name]
+	spec = importlib.util.spec_from_file_location(name, os.path.join(here, path))
+	module = importlib.util.module_from_spec(spec)
+	sys.modules[name] = module
+	with contextlib.redirect_stdout(io.StringIO()):
+		spec.loader.exec_module(module)
+	return module
@@ -1,4 +1,6 @@
 
+from copy import copy
+
 def merge(x, y, i = 0, j = 0, acc = None):
 	acc = acc or []
 	while True:
@@ -20,6 +22,8 @@ def merge_sort(x):
 	mid = len(x) // 2
 	return merge(merge_sort(x[:mid]), merge_sort(x[mid:]))
 
+list_merge_sort = merge_sort # merge_sort is redefined below
+
 def inplace_merge(x, i, j, k, l):
 	# invariant: i <= j <= k <= l
 	if i == j or k == l: return # nothing left to be done
@@ -30,15 +34,26 @@ def inplace_merge(x, i, j, k, l):
 		inplace_merge(x, i + 1, j, k, l)
 
 
-def inplace_merge(x, i, j, k, l):
-	while True:
-		# invariant: i <= j < k <= l
-		if i == j or k == l: return # nothing left to be done
-		if x[i] < x[k]:
-			i += 1
+def inplace_merge(x, i, j, k, l, buf = None):
+	# invariant: i <= j == k <= l, with x[i:j] and x[k:l] sorted.
+	# The left run is copied to the scratch buffer, at the same
+	# indices, and merged back into x[i:l]. The write index never
+	# passes the read index in the right run, so we never overwrite
+	# an element we haven't looked at yet.
+	if i == j or k == l: return # nothing left to be done
+	if buf is None: buf = copy(x)
+	buf[i:j] = x[i:j]
+	a, b, w = i, k, i
+	while a < j and b < l:
+		if x[b] < buf[a]:
+			x[w] = x[b]
+			b += 1
 		else:
-			x[i], x[k] = x[k], x[i]
-			i += 1
+			x[w] = buf[a]
+			a += 1
+		w += 1
+	# whatever is left of the right run is already in place
+	x[w:w + j - a] = buf[a:j]
 
 y = []
 inplace_merge(y, 0, 1, 1, 1)
@@ -53,15 +68,17 @@ y = [1,2, 0,3,4]
 inplace_merge(y, 0, 2, 2, 5)
 print(y)
 
-def merge_sort_rec(x, low, high):
+def merge_sort_rec(x, low, high, buf):
 	if high - low <= 1: return
 	mid = (low + high) // 2
-	merge_sort_rec(x, low, mid)
-	merge_sort_rec(x, mid, high)
-	inplace_merge(x, low, mid, mid, high)
+	merge_sort_rec(x, low, mid, buf)
+	merge_sort_rec(x, mid, high, buf)
+	inplace_merge(x, low, mid, mid, high, buf)
 	
 def merge_sort(x):
-	merge_sort_rec(x, 0, len(x))
+	# one scratch buffer for the whole sort instead of
+	# a new list per merge
+	merge_sort_rec(x, 0, len(x), copy(x))
 	return x
 
 x = []
@@ -81,3 +98,159 @@ print(merge_sort(x))
 
 x = [3,2,1]
 print(merge_sort(x))
+
+
+## Bottom-up merge sort engine.
+# x can be a list, an array.array or a numpy array; all merging
+# goes through one extra buffer of the same type, so we allocate
+# O(n) in total rather than a new list for every merge.
+
+def insertion_sort_range(x, low, high):
+	for i in range(low + 1, high):
+		e = x[i]
+		j = i
+		while j > low and e < x[j - 1]:
+			x[j] = x[j - 1]
+			j -= 1
+		x[j] = e
+
+def merge_into(src, dst, low, mid, high):
+	# merge src[low:mid] and src[mid:high] into dst[low:high]
+	i, j, k = low, mid, low
+	while i < mid and j < high:
+		if src[j] < src[i]:
+			dst[k] = src[j]
+			j += 1
+		else:
+			dst[k] = src[i]
+			i += 1
+		k += 1
+	dst[k:k + mid - i] = src[i:mid]
+	k += mid - i
+	dst[k:high] = src[j:high]
+
+def sort_blocks(x, block):
+	# sort short blocks with insertion sort; merging
+	# blocks of size one is mostly interpreter overhead
+	n = len(x)
+	for low in range(0, n, block):
+		insertion_sort_range(x, low, min(low + block, n))
+
+def merge_sort_buffer(x, block = 32):
+	n = len(x)
+	sort_blocks(x, block)
+	buf = copy(x)
+	width = block
+	while width < n:
+		for low in range(0, n - width, 2 * width):
+			mid = low + width
+			inplace_merge(x, low, mid, mid, min(mid + width, n), buf)
+		width *= 2
+	return x
+
+def merge_sort_alternate(x, block = 32):
+	# each pass merges from src to dst and then the two swap
+	# roles, so unlike inplace_merge we never copy a run just
+	# to get it out of the way.
+	n = len(x)
+	sort_blocks(x, block)
+	src, dst = x, copy(x)
+	width = block
+	while width < n:
+		for low in range(0, n, 2 * width):
+			mid = min(low + width, n)
+			merge_into(src, dst, low, mid, min(low + 2 * width, n))
+		src, dst = dst, src
+		width *= 2
+	if src is not x:
+		x[:] = src
+	return x
+
+def find_runs(x, min_run = 32):
+	# Split x into maximal ascending runs (strictly descending
+	# runs are reversed in place, which keeps the sort stable)
+	# and extend short runs to min_run with insertion sort.
+	# Returns the run boundaries, starting with 0 and ending in n.
+	n = len(x)
+	bounds = [0]
+	low = 0
+	while low < n:
+		high = low + 1
+		if high < n and x[high] < x[low]:
+			while high < n and x[high] < x[high - 1]:
+				high += 1
+			x[low:high] = x[low:high][::-1]
+		else:
+			while high < n and not x[high] < x[high - 1]:
+				high += 1
+		if high - low < min_run:
+			high = min(low + min_run, n)
+			insertion_sort_range(x, low, high)
+		bounds.append(high)
+		low = high
+	return bounds
+
+def merge_sort_natural(x, min_run = 32):
+	# Merge neighbouring runs pairwise, alternating between
+	# x and the buffer. Presorted input has few runs, so it
+	# needs few passes; sorted input needs none.
+	bounds = find_runs(x, min_run)
+	src, dst = x, copy(x)
+	while len(bounds) > 2:
+		merged = [0]
+		for r in range(0, len(bounds) - 1, 2):
+			low = bounds[r]
+			if r + 2 < len(bounds):
+				mid, high = bounds[r + 1], bounds[r + 2]
+			else: # odd run out, just copy it over
+				mid = high = bounds[r + 1]
+			merge_into(src, dst, low, mid, high)
+			merged.append(high)
+		bounds = merged
+		src, dst = dst, src
+	if src is not x:
+		x[:] = src
+	return x
+
+merge_sort_engines = {
+	'buffer':    merge_sort_buffer,
+	'alternate': merge_sort_alternate,
+	'natural':   merge_sort_natural,
+}
+
+def sort_inplace(x, mode = 'alternate'):
+	return merge_sort_engines[mode](x)
+
+from array import array
+from random import randrange, seed
+seed(1)
+for mode in merge_sort_engines:
+	for n in range(0, 200, 7):
+		x = [randrange(10) for _ in range(n)]
+		assert sort_inplace(list(x), mode) == sorted(x), mode
+		y = array('q', x)
+		assert list(sort_inplace(y, mode)) == sorted(x), mode
+		assert sort_inplace(sorted(x)[::-1], mode) == sorted(x), mode
+	print(mode, sort_inplace([3, 1, 2, 5, 4, 2], mode))
+
+
+if __name__ == '__main__':
+	from time import perf_counter
+	print("n algorithm seconds")
+	for n in (10**4, 10**5, 10**6):
+		data = [randrange(n) for _ in range(n)]
+		runs = [
+			('list_merge_sort', lambda: list_merge_sort(list(data))),
+			('merge_sort', lambda: merge_sort(list(data))),
+			('sorted', lambda: sorted(data)),
+		]
+		for mode in merge_sort_engines:
+			runs.append((mode, lambda mode=mode: sort_inplace(list(data), mode)))
+		runs.append(('alternate-array',
+		             lambda: sort_inplace(array('q', data), 'alternate')))
+		runs.append(('natural-presorted',
+		             lambda: sort_inplace(sorted(data), 'natural')))
+		for name, run in runs:
+			start = perf_counter()
+			run()
+			print(n, name, round(perf_counter() - start, 3))
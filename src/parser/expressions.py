@@ -85,7 +85,11 @@ print(evaluate('((2 + 2) * 3)'))
 # PEXP := '(' EXP ')'
 
 class ParseError(Exception):
-	pass
+	def __init__(self, message = None, column = None):
+		if column is not None:
+			message = "{} at column {}".format(message, column)
+		super().__init__(*([message] if message else []))
+		self.column = column
 
 def evaluate_exp(expr, i):
 	try:
@@ -206,10 +210,502 @@ def evaluate_term(expr, i):
 
 print("infix 4")
 print(evaluate('12'))
-print(evaluate('-12'))
+try:
+	print(evaluate('-12'))
+except ParseError:
+	print("ParseError") # the tokeniser splits '-12' into '-' and '12'
 print(evaluate('(12)'))
 print(evaluate('(2 + 3)'))
 print(evaluate('2 + 3 + 4'))
 print(evaluate('((2 + 2) * 3)'))
 
 print(evaluate('2 - 2 + 2'))
+
+
+## Scanning tokens
+# tokenise copies the whole string once for each operator and then
+# splits it, and it can't tell a negative number from a minus. A
+# scanner instead matches one token at a time with a compiled regular
+# expression, starting where the previous token ended, and yields
+# each token with its kind and column as it goes. Whether a '-' is
+# part of a number depends on where it is: after an operator or an
+# opening parenthesis, or at the start, an operand must come next,
+# so '-12' is a number there. A '-' or '~' in that position that is
+# not followed by a number negates what follows.
+
+import re
+
+number = r'\d+\.\d*(?:[eE][-+]?\d+)?|\.\d+(?:[eE][-+]?\d+)?|\d+(?:[eE][-+]?\d+)?'
+operand_re = re.compile(r'\s*(?:(?P<num>-?(?:{}))|(?P<neg>[-~])|(?P<lpar>\()'
+                        r'|(?P<var>[A-Za-z_]\w*)|(?P<end>$)|(?P<error>.))'.format(number))
+operator_re = re.compile(r'\s*(?:(?P<op>[-+*/])|(?P<rpar>\))'
+                         r'|(?P<end>$)|(?P<error>.))')
+
+class Token:
+	__slots__ = ('kind', 'text', 'value', 'column')
+	def __init__(self, kind, text, value, column):
+		self.kind = kind
+		self.text = text
+		self.value = value
+		self.column = column
+	def __repr__(self):
+		return "Token({!r}, {!r}, {})".format(self.kind, self.text, self.column)
+
+def tokens(expr):
+	pos = 0
+	want_operand = True
+	while True:
+		m = (operand_re if want_operand else operator_re).match(expr, pos)
+		kind = m.lastgroup
+		pos = m.end()
+		if kind == 'end':
+			return
+		text, column = m.group(kind), m.start(kind)
+		if kind == 'error':
+			raise ParseError("unexpected {!r}".format(text), column)
+		value = text if kind == 'var' else None
+		if kind == 'num':
+			if '.' in text or 'e' in text or 'E' in text:
+				value = float(text)
+			else:
+				value = int(text)
+		yield Token(kind, text, value, column)
+		want_operand = kind in ('op', 'neg', 'lpar')
+
+print("tokens")
+print(list(tokens('-12 + (2.5*-3) - -(4)')))
+print([token.text for token in tokens('(2+3)')], tokenise('(2+3)'))
+try:
+	list(tokens('2 + $'))
+except ParseError as error:
+	print(error, error.column)
+
+
+## Compiling expressions
+# evaluate tokenises and parses the string every time we call it.
+# If we evaluate the same expression many times, we can parse it
+# once, into a tree of nodes, and then translate the tree into a
+# Python expression that we compile to byte code. Evaluating is
+# then a single call. Compiled expressions are cached by their
+# source text, with the least recently used evicted when there are
+# more than 256 of them.
+
+import builtins
+from functools import lru_cache
+
+class Num:
+	__slots__ = ('value',)
+	def __init__(self, value):
+		self.value = value
+
+class BinOp:
+	__slots__ = ('op', 'left', 'right')
+	def __init__(self, op, left, right):
+		self.op = op
+		self.left = left
+		self.right = right
+
+class Neg:
+	__slots__ = ('operand',)
+	def __init__(self, operand):
+		self.operand = operand
+
+class Var:
+	__slots__ = ('name',)
+	def __init__(self, name):
+		self.name = name
+
+## Precedence without recursion
+# The recursive descent parsers above use one Python call per level
+# of nesting, and per operator in a chain, so long or deeply nested
+# expressions hit the recursion limit, and they group a - b + c as
+# a - (b + c). The shunting-yard algorithm reads the tokens left to
+# right with two explicit stacks, one of operands and one of pending
+# operators. Before pushing an operator we first apply every pending
+# operator that binds at least as tightly; that gives * and / higher
+# precedence than + and -, and makes all four left associative.
+# Negation binds tightest and, as a prefix operator, is pushed
+# without applying anything. What "applying" means is up to the
+# caller, so the same loop builds trees and computes values.
+
+precedence = {'+': 1, '-': 1, '*': 2, '/': 2, 'neg': 3}
+
+def unknown_variable(name):
+	raise NameError("unknown variable {!r}".format(name))
+
+def shunting_yard(expr, number, unary, binary, variable = unknown_variable):
+	operands, operators = [], [] # operators as (op, column)
+	def apply():
+		op, column = operators.pop()
+		if op == 'neg':
+			operands.append(unary(operands.pop()))
+		else:
+			right = operands.pop()
+			operands.append(binary(op, operands.pop(), right))
+	last = None
+	for token in tokens(expr):
+		kind = last = token.kind
+		if kind == 'num':
+			operands.append(number(token.value))
+		elif kind == 'var':
+			operands.append(variable(token.value))
+		elif kind == 'neg' or kind == 'lpar':
+			operators.append((kind, token.column))
+		elif kind == 'rpar':
+			while operators and operators[-1][0] != 'lpar':
+				apply()
+			if not operators:
+				raise ParseError("unmatched ')'", token.column)
+			operators.pop()
+		else:
+			prec = precedence[token.text]
+			while operators and operators[-1][0] != 'lpar' and \
+			      precedence[operators[-1][0]] >= prec:
+				apply()
+			operators.append((token.text, token.column))
+	if last is None or last in ('op', 'neg', 'lpar'):
+		raise ParseError("expected a number", len(expr))
+	while operators:
+		if operators[-1][0] == 'lpar':
+			raise ParseError("unmatched '('", operators[-1][1])
+		apply()
+	return operands[0]
+
+def parse(expr):
+	return shunting_yard(expr, Num, Neg, BinOp, Var)
+
+descent_evaluate = evaluate # the recursive descent version
+
+def evaluate(expr, **values):
+	def variable(name):
+		if name not in values:
+			unknown_variable(name)
+		return values[name]
+	return shunting_yard(expr, lambda value: value, operator.neg,
+	                     lambda op, a, b: operator_table[op](a, b), variable)
+
+def fold(tree, leaf, unary, binary):
+	# Combine the values of the children bottom up, with an explicit
+	# stack instead of recursion; expanded says that the children of
+	# the node have already been pushed.
+	results = []
+	stack = [(tree, False)]
+	while stack:
+		node, expanded = stack.pop()
+		if isinstance(node, Neg):
+			if expanded:
+				results.append(unary(node, results.pop()))
+			else:
+				stack.append((node, True))
+				stack.append((node.operand, False))
+		elif isinstance(node, BinOp):
+			if expanded:
+				right = results.pop()
+				results.append(binary(node, results.pop(), right))
+			else:
+				stack.append((node, True))
+				stack.append((node.right, False))
+				stack.append((node.left, False))
+		else:
+			results.append(leaf(node))
+	return results[0]
+
+def variables(tree):
+	# the names of the variables, in the order they first appear
+	names = {}
+	for node in nodes(tree):
+		if isinstance(node, Var):
+			names.setdefault(node.name)
+	return tuple(names)
+
+def children(node):
+	if isinstance(node, Neg):
+		return (node.operand,)
+	if isinstance(node, BinOp):
+		return (node.left, node.right)
+	return ()
+
+def nodes(tree):
+	# every distinct node once, children before their parents
+	order, seen = [], set()
+	stack = [(tree, False)]
+	while stack:
+		node, expanded = stack.pop()
+		if expanded:
+			order.append(node)
+		elif id(node) not in seen:
+			seen.add(id(node))
+			stack.append((node, True))
+			for child in reversed(children(node)):
+				stack.append((child, False))
+	return order
+
+def count_nodes(tree):
+	return len(nodes(tree))
+
+
+## Optimising
+# Before we generate code, we fold sub-trees without variables into
+# their values. If folding fails, as for 1 / 0 or a float overflow,
+# we leave the sub-tree alone, so the error comes when we evaluate,
+# as it would without optimising. We don't drop identities such as
+# x * 1, x + 0 or --x: we don't know the types of the variables, and
+# for each of them some type gives a different result. 0 - x is 0.0
+# where -x is -0.0, x * 1 turns a bool into an int, and x / 1 turns
+# an int into a float.
+# We also build every node through a table keyed by its operator
+# and the identity of its children, so two equal sub-expressions
+# become the same node, and the tree becomes a DAG where each shared
+# sub-expression is evaluated once. For + and * the key ignores the
+# order of the children, so x * y and y * x are shared as well.
+# Constants are keyed on their repr, since 0.0 == -0.0 but dividing
+# by them gives different infinities.
+
+def optimise(tree):
+	table = {}
+	def make(key, build):
+		if key not in table:
+			table[key] = build()
+		return table[key]
+	def leaf(node):
+		if isinstance(node, Var):
+			return make(('var', node.name), lambda: Var(node.name))
+		value = node.value
+		return make(('num', type(value), repr(value)), lambda: Num(value))
+	def unary(node, operand):
+		if isinstance(operand, Num):
+			return leaf(Num(-operand.value))
+		return make(('neg', id(operand)), lambda: Neg(operand))
+	def binary(node, left, right):
+		op = node.op
+		if isinstance(left, Num) and isinstance(right, Num):
+			try:
+				return leaf(Num(operator_table[op](left.value, right.value)))
+			except ArithmeticError:
+				pass # leave the error for later
+		if op in '+*':
+			key = (op,) + tuple(sorted((id(left), id(right))))
+		else:
+			key = (op, id(left), id(right))
+		return make(key, lambda: BinOp(op, left, right))
+	return fold(tree, leaf, unary, binary)
+
+# We generate a Python function with one assignment for each node
+# that is used more than once, so it is only computed once, and
+# nested expressions for the rest. Python's compiler recurses over
+# nested expressions, so we also break them up with an assignment
+# whenever they get deeper than max_nesting. Constants are bound to
+# names in the function's globals rather than written out, since the
+# repr of a float such as inf or nan is not valid Python.
+
+max_nesting = 50
+
+def to_function(dag, variables):
+	params = {name: "v{}".format(i) for i, name in enumerate(variables)}
+	order = nodes(dag)
+	uses = {}
+	for node in order:
+		for child in children(node):
+			uses[id(child)] = uses.get(id(child), 0) + 1
+	code, nesting, lines, constants = {}, {}, [], {}
+	for node in order:
+		if isinstance(node, Var):
+			code[id(node)], nesting[id(node)] = params[node.name], 0
+			continue
+		if isinstance(node, Num):
+			name = "c{}".format(len(constants))
+			constants[name] = node.value
+			code[id(node)], nesting[id(node)] = name, 0
+			continue
+		if isinstance(node, Neg):
+			text = "(-{})".format(code[id(node.operand)])
+		else:
+			text = "({} {} {})".format(code[id(node.left)], node.op, code[id(node.right)])
+		level = 1 + max(nesting[id(child)] for child in children(node))
+		if uses.get(id(node), 0) > 1 or level > max_nesting:
+			name = "t{}".format(len(lines))
+			lines.append("    {} = {}".format(name, text))
+			text, level = name, 0
+		code[id(node)], nesting[id(node)] = text, level
+	source = "def expression({}):\n{}\n    return {}\n".format(
+		", ".join(params.values()), "".join(line + "\n" for line in lines),
+		code[id(dag)])
+	namespace = dict(constants)
+	exec(builtins.compile(source, "<expression>", "exec"), namespace)
+	return namespace['expression']
+
+import numpy as np
+
+class Expression:
+	__slots__ = ('source', 'tree', 'variables', 'function', 'node_counts')
+	def __init__(self, source, tree, optimised = True):
+		self.source = source
+		before = count_nodes(tree)
+		if optimised:
+			tree = optimise(tree)
+		self.tree = tree
+		self.node_counts = (before, count_nodes(tree))
+		self.variables = variables(tree)
+		self.function = to_function(tree, self.variables)
+
+	def evaluate(self, **values):
+		if not self.variables:
+			return self.function()
+		try:
+			return self.function(*[values[name] for name in self.variables])
+		except KeyError as error:
+			unknown_variable(error.args[0])
+
+	def evaluate_batch(self, chunk_size = 2**16, **arrays):
+		# Evaluate elementwise over numpy arrays bound to the variables.
+		# The generated code works on arrays as it does on numbers, but
+		# every operator makes a temporary array as long as its inputs,
+		# so we go through the arrays in chunks of chunk_size rows and
+		# write each chunk of the result into a single output array.
+		for name in self.variables:
+			if name not in arrays:
+				unknown_variable(name)
+		columns = [np.asarray(arrays[name]) for name in self.variables]
+		lengths = {name: len(a) for name, a in zip(self.variables, columns) if a.ndim > 0}
+		if len(set(lengths.values())) > 1:
+			raise ValueError("arrays of different lengths: {}".format(
+				", ".join("{} has {}".format(name, n) for name, n in lengths.items())))
+		n = max(lengths.values(), default=1)
+		# the result type, from evaluating on empty chunks
+		empty = self.function(*[a[:0] if a.ndim > 0 else a for a in columns])
+		out = np.empty(n, dtype=np.result_type(empty))
+		for low in range(0, n, chunk_size):
+			high = min(low + chunk_size, n)
+			args = [a[low:high] if a.ndim > 0 else a for a in columns]
+			out[low:high] = self.function(*args)
+		return out
+
+@lru_cache(maxsize=256)
+def compile(expr, optimised = True):
+	return Expression(expr, parse(expr), optimised)
+
+def evaluate_batch(expr, chunk_size = 2**16, **arrays):
+	return compile(expr).evaluate_batch(chunk_size, **arrays)
+
+print("compiled")
+for e, v in (('12', 12), ('(12)', 12), ('(2 + 3)', 5), ('2 + 3 + 4', 9),
+             ('((2 + 2) * 3)', 12), ('2 - 2 + 2', 2), ('8 - 1 - 1 - 1', 5),
+             ('2 + 3 * 4', 14), ('7 / 2', 3.5), ('-(1 + 2) * 3', -9), ('2 * -3', -6)):
+	assert compile(e).evaluate() == evaluate(e) == v
+	print(e, compile(e).evaluate())
+print(compile.cache_info())
+print(compile('-12').evaluate(), compile('-(2 + 3) * 1.5').evaluate())
+assert compile('1e400').evaluate() == evaluate('1e400') == float('inf')
+for e in ('(2 + 3', '2 + 3)', '2 +', ''):
+	try:
+		compile(e)
+	except ParseError as error:
+		print(repr(e), error)
+
+chain = ' + '.join(['1'] * 5000)
+nested = '(' * 2000 + '1' + ')' * 2000
+print(evaluate(chain), compile(chain).evaluate(), evaluate(nested), compile(nested).evaluate())
+
+print("variables")
+e = compile('(x + 1) * y - x / 2')
+print(e.variables, e.evaluate(x=3, y=2), evaluate('(x + 1) * y - x / 2', x=3, y=2))
+xs, ys = np.arange(10.0), np.arange(10.0, 20.0)
+batch = e.evaluate_batch(chunk_size=3, x=xs, y=ys)
+assert np.allclose(batch, (xs + 1) * ys - xs / 2)
+print(batch)
+deep = compile(' + '.join(['x'] * 500))
+assert deep.evaluate(x=2) == 1000
+assert np.allclose(deep.evaluate_batch(x=xs), 500 * xs)
+assert e.evaluate_batch(x=xs[:0], y=ys[:0]).shape == (0,)
+try:
+	e.evaluate_batch(x=xs, y=ys[:5])
+except ValueError as error:
+	print(error)
+
+print("optimised")
+for e in ('(x * 1 + 0) * (2 + 3)', '(x + y) * (y + x) - (x + y) / 2',
+          '--x - 0 + (1 - 1) * y', '(a*b + c) * (a*b + c) + (b*a + c)'):
+	plain, opt = compile(e, optimised=False), compile(e)
+	values = dict(x=3, y=4, a=2, b=5, c=7)
+	args = {name: values[name] for name in plain.variables}
+	assert plain.evaluate(**args) == opt.evaluate(**{n: values[n] for n in opt.variables})
+	print(e, "nodes", plain.node_counts[0], "->", opt.node_counts[1])
+e = 'x / 1 * 4611686018427387904'
+assert type(compile('x / 1').evaluate(x=3)) is float
+assert compile('1e308 * 10').evaluate() == compile('1e308 * 10', optimised=False).evaluate()
+ones = np.array([1.0])
+with np.errstate(divide='ignore', invalid='ignore'):
+	assert np.array_equal(compile('x / 0.0 + x / -0.0').evaluate_batch(x=ones),
+	                      compile('x / 0.0 + x / -0.0', optimised=False).evaluate_batch(x=ones),
+	                      equal_nan=True)
+assert compile(e).evaluate(x=4) == compile(e, optimised=False).evaluate(x=4)
+big = '1' + '0' * 400 + ' / 3 + x'
+try:
+	compile(big).evaluate(x=1)
+except OverflowError as error:
+	print(big[:10] + '...', error)
+zeros, bools = np.array([0.0, -0.0]), np.array([True, False])
+with np.errstate(divide='ignore'):
+	for e, xs in (('1 / (0 - x)', zeros), ('1 / (x + 0)', zeros),
+	              ('1 / (0 + x)', zeros), ('x * 1', bools), ('x - 0', bools)):
+		opt, plain = compile(e).evaluate_batch(x=xs), compile(e, optimised=False).evaluate_batch(x=xs)
+		assert opt.dtype == plain.dtype and np.array_equal(opt, plain), e
+assert np.array_equal(compile(e).evaluate_batch(x=np.array([4, 5])),
+                      compile(e, optimised=False).evaluate_batch(x=np.array([4, 5])))
+
+
+if __name__ == '__main__':
+	from timeit import timeit
+	e = '((2 + 2) * 3) - (4 / (1 + 1)) * 5'
+	n = 10**5
+	parsing = timeit(lambda: descent_evaluate(e), number=n)
+	compiled = timeit(lambda: compile(e).evaluate(), number=n)
+	print("evaluate", round(parsing / n * 1e6, 3), "us")
+	print("cached compile", round(compiled / n * 1e6, 3), "us")
+	print("speedup", round(parsing / compiled, 1))
+
+	import tracemalloc
+	e = ' + '.join('({} * {})'.format(i, i + 1) for i in range(10**4))
+	for name, f in (('tokenise', tokenise),
+	                ('scanner', lambda e: sum(1 for _ in tokens(e)))):
+		tracemalloc.start()
+		seconds = timeit(lambda: f(e), number=10)
+		_, peak = tracemalloc.get_traced_memory()
+		tracemalloc.stop()
+		print(name, len(e), "chars", round(seconds / 10, 4), "s", peak, "peak bytes")
+
+	from time import perf_counter
+	print("chars seconds")
+	for terms in (10**3, 10**4, 10**5):
+		e = ' - '.join('(({} * 2) + 1)'.format(i) for i in range(terms))
+		start = perf_counter()
+		evaluate(e)
+		print(len(e), round(perf_counter() - start, 3))
+
+	print("rows batch row-by-row")
+	e = compile('(x * 1.5 + y) / (y + 2) - -x')
+	for n in (10**5, 10**6, 10**7):
+		xs, ys = np.random.rand(n), np.random.rand(n)
+		start = perf_counter()
+		e.evaluate_batch(x=xs, y=ys)
+		batch = perf_counter() - start
+		rows = None
+		if n <= 10**6:
+			start = perf_counter()
+			for x, y in zip(xs.tolist(), ys.tolist()):
+				e.evaluate(x=x, y=y)
+			rows = round(perf_counter() - start, 3)
+		print(n, round(batch, 3), rows)
+
+	print("generated formula nodes before after seconds-plain seconds-optimised")
+	term = '(x * y + (x - y) / (x + y + 1))'
+	e = ' + '.join('{} * {}'.format(term, i % 3) for i in range(200))
+	plain, opt = compile(e, optimised=False), compile(e)
+	xs, ys = np.random.rand(10**6), np.random.rand(10**6)
+	start = perf_counter()
+	plain.evaluate_batch(x=xs, y=ys)
+	t_plain = perf_counter() - start
+	start = perf_counter()
+	opt.evaluate_batch(x=xs, y=ys)
+	t_opt = perf_counter() - start
+	print(len(e), plain.node_counts[1], opt.node_counts[1], round(t_plain, 3), round(t_opt, 3))
@@ -1,4 +1,8 @@
 
+# The counts of the last call of each sort, so other scripts can get
+# them without reading what we print.
+last_counts = {}
+
 def selection_sort(x):
 	x = x[:]
 	comparisons, swaps = 0, 0
@@ -19,6 +23,7 @@ def selection_sort(x):
 
 		
 
+	last_counts["selection"] = (comparisons, swaps)
 	print("selection", comparisons, swaps)
 	return x
 
@@ -33,6 +38,7 @@ def insertion_sort(x):
 			j -= 1		
 			swaps += 1
 			comparisons += 1
+	last_counts["insertion"] = (comparisons, swaps)
 	print("insertion", comparisons, swaps)
 	return x
 
@@ -52,6 +58,7 @@ def bubble_sort(x):
 		if not swapped:
 			break
 
+	last_counts["bubble"] = (comparisons, swaps)
 	print("bubble", comparisons, swaps)
 	return x
 
@@ -80,6 +87,7 @@ def cocktail_sort(x):
 		if not swapped:
 			break
 
+	last_counts["cocktail"] = (comparisons, swaps)
 	print("cocktail", comparisons, swaps)
 	return x
 
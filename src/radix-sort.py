@@ -62,3 +62,282 @@ for j in range(d):
 	keys = key_result
 	values = value_result
 	print(keys)
+
+
+## LSD radix sort on arrays
+# Instead of a list of lists per bucket and a tuple of sub-keys per
+# element, each pass counts how many keys have each digit, turns the
+# counts into start positions with a prefix sum, and moves every key
+# (and its value) straight to its place in an output buffer. The
+# output buffer is allocated once, and the input and output swap
+# roles between passes. If all keys have the same digit, the pass
+# would not move anything, so we skip it.
+#
+# Signed keys are sorted as unsigned keys with the sign bit flipped,
+# which puts the negative numbers first. Digits can be 8, 11 or 16
+# bits; wider digits mean fewer passes but more buckets to count.
+
+from array import array
+import numpy as np
+
+def radix_sort_array(keys, values = None, bits = 8):
+	# keys (and values) are array.array, sorted in place
+	n = len(keys)
+	width = 8 * keys.itemsize
+	flip = 1 << (width - 1) if keys.typecode in 'bhilq' else 0
+	full = (1 << width) - 1
+	mask = (1 << bits) - 1
+	src, dst = keys, array(keys.typecode, keys)
+	vsrc = values
+	vdst = array(values.typecode, values) if values is not None else None
+	for shift in range(0, width, bits):
+		digits = [(((k ^ flip) & full) >> shift) & mask for k in src]
+		counts = [0] * (mask + 1)
+		for d in digits:
+			counts[d] += 1
+		if max(counts) == n:
+			continue # every key has the same digit
+		start = 0
+		for d in range(mask + 1):
+			counts[d], start = start, start + counts[d]
+		for i, d in enumerate(digits):
+			dst[counts[d]] = src[i]
+			if vsrc is not None:
+				vdst[counts[d]] = vsrc[i]
+			counts[d] += 1
+		src, dst = dst, src
+		vsrc, vdst = vdst, vsrc
+	if src is not keys:
+		keys[:] = src
+		if values is not None:
+			values[:] = vsrc
+	return keys if values is None else (keys, values)
+
+def radix_sort_numpy(keys, values = None, bits = 8):
+	# Numpy has no stable scatter, so the positions within a bucket
+	# come from a stable argsort of the digits; for 8 and 16 bit
+	# digits numpy does that with a counting sort in C. We gather
+	# into the preallocated buffer with np.take.
+	if keys.dtype.kind not in 'iu':
+		# the bits of floats and bools don't sort as unsigned integers
+		raise TypeError("radix sort needs integer keys, not {}".format(keys.dtype))
+	n = len(keys)
+	width = 8 * keys.dtype.itemsize
+	unsigned = np.dtype('u{}'.format(keys.dtype.itemsize))
+	bits = min(bits, width)
+	ukeys = keys.view(unsigned)
+	if keys.dtype.kind == 'i':
+		ukeys = ukeys ^ unsigned.type(1 << (width - 1))
+	digit_type = np.uint8 if bits <= 8 else np.uint16
+	mask = unsigned.type((1 << bits) - 1)
+	# The keys and values go back and forth between two buffers, and
+	# keys and values are one of them, except that signed keys are
+	# first copied with their sign bit flipped. Each pass also
+	# allocates the digits, one or two bytes per key, and the 8n bytes
+	# of the order from argsort, which can't write into a buffer we give it.
+	src, dst = ukeys, np.empty_like(ukeys)
+	vsrc = values
+	vdst = np.empty_like(values) if values is not None else None
+	for shift in range(0, width, bits):
+		digits = ((src >> unsigned.type(shift)) & mask).astype(digit_type)
+		counts = np.bincount(digits, minlength=1 << bits)
+		if counts.max() == n:
+			continue # every key has the same digit
+		order = np.argsort(digits, kind='stable')
+		np.take(src, order, out=dst)
+		src, dst = dst, src
+		if values is not None:
+			np.take(vsrc, order, out=vdst)
+			vsrc, vdst = vdst, vsrc
+	if keys.dtype.kind == 'i':
+		src ^= unsigned.type(1 << (width - 1))
+	keys[:] = src.view(keys.dtype)
+	if values is not None and vsrc is not values:
+		values[:] = vsrc
+	return keys if values is None else (keys, values)
+
+def radix_sort(keys, values = None, bits = 8):
+	if bits not in (8, 11, 16):
+		raise ValueError("digits must be 8, 11 or 16 bits")
+	if isinstance(keys, np.ndarray):
+		return radix_sort_numpy(keys, values, bits)
+	return radix_sort_array(keys, values, bits)
+
+from random import randrange, choice
+for bits in (8, 11, 16):
+	for typecode in 'bBhHiIlLqQ':
+		width = 8 * array(typecode).itemsize
+		if typecode.islower():
+			low, high = -2**(width - 1), 2**(width - 1)
+		else:
+			low, high = 0, 2**width
+		# few distinct keys, so we also see if equal keys keep their order
+		distinct = [randrange(low, high) for _ in range(20)]
+		x = array(typecode, [choice(distinct) for _ in range(200)])
+		v = array('l', range(200))
+		expect = sorted(zip(x, v), key=lambda kv: kv[0])
+		k, v = radix_sort(array(typecode, x), v, bits)
+		assert list(zip(k, v)) == expect
+	for dtype in (np.int8, np.uint16, np.int32, np.uint32, np.int64):
+		info = np.iinfo(dtype)
+		distinct = np.random.randint(info.min, info.max, size=20, dtype=dtype)
+		x = np.random.choice(distinct, size=1000)
+		k, v = radix_sort(x.copy(), np.arange(1000), bits)
+		assert (k == np.sort(x)).all()
+		assert (v == np.argsort(x, kind='stable')).all()
+print(radix_sort(array('i', [3, -1, 256, 2**20, -2**20, 0])))
+print(radix_sort(np.array([3, -1, 256, 2**20, -2**20, 0]), np.arange(6)))
+for x in (np.array([-1., 2., -3., .5]), np.array([True, False])):
+	try:
+		radix_sort(x)
+	except TypeError as error:
+		print(error)
+
+
+if __name__ == '__main__':
+	from time import perf_counter
+	print("n algorithm seconds")
+	for n in (10**5, 10**6, 10**7):
+		x = np.random.randint(0, 2**32, size=n, dtype=np.uint32)
+		v = np.arange(n, dtype=np.uint32)
+		for bits in (8, 11, 16):
+			k = x.copy()
+			start = perf_counter()
+			radix_sort(k, v.copy(), bits)
+			print(n, "numpy radix", bits, round(perf_counter() - start, 3))
+		k = x.copy()
+		start = perf_counter()
+		k.sort(kind='stable')
+		print(n, "np.sort stable", round(perf_counter() - start, 3))
+		if n <= 10**5:
+			k = array('I', x.tolist())
+			start = perf_counter()
+			radix_sort(k, array('I', v.tolist()), 8)
+			print(n, "array radix 8", round(perf_counter() - start, 3))
+			start = perf_counter()
+			sorted(x.tolist())
+			print(n, "sorted", round(perf_counter() - start, 3))
+
+
+## MSD radix sort for strings
+# Strings and byte strings don't have a fixed number of digits, so
+# we sort from the most significant character instead, with three-way
+# radix quicksort: partition on the character at depth d into the
+# strings with a smaller, equal or larger character than a pivot.
+# Only the equal part moves on to depth d + 1, so a shared prefix is
+# inspected once per string rather than once per comparison, as a
+# comparison sort must do. Parts with fewer than cutoff strings are
+# finished with insertion sort, and parts with one string need no
+# work at all. Pending parts are kept on an explicit stack, since
+# long shared prefixes would otherwise mean deep recursion.
+
+def common_prefix(a, b, d):
+	# the length of the common prefix of a and b, known to be at least d
+	n = min(len(a), len(b))
+	while d < n and a[d] == b[d]:
+		d += 1
+	return d
+
+def insertion_sort_strings(x, low, high, d = 0, count = False):
+	# All strings in x[low:high] share their first d characters. If
+	# count is true, we return how many characters the comparisons
+	# looked at after those.
+	chars = 0
+	for i in range(low + 1, high):
+		j = i
+		while j > low:
+			if count:
+				chars += common_prefix(x[j-1], x[j], d) - d + 1
+			if not x[j-1] > x[j]:
+				break
+			x[j-1], x[j] = x[j], x[j-1]
+			j -= 1
+	return chars
+
+def string_sort(x, cutoff = 16, stats = None):
+	# Sorts a list of str or of bytes in place. If stats is a dict,
+	# we record how many characters we looked at in stats['chars'];
+	# counting them in insertion sort slows it down.
+	if not x: return x
+	end = -1 if isinstance(x[0], (bytes, bytearray)) else '' # below all chars
+	chars = 0
+	stack = [(0, len(x), 0)]
+	while stack:
+		low, high, d = stack.pop()
+		if high - low <= 1:
+			continue
+		if high - low < cutoff:
+			chars += insertion_sort_strings(x, low, high, d, stats is not None)
+			continue
+		mid = (low + high) // 2
+		x[low], x[mid] = x[mid], x[low]
+		v = x[low][d] if d < len(x[low]) else end
+		lt, i, gt = low, low + 1, high - 1
+		while i <= gt:
+			s = x[i]
+			c = s[d] if d < len(s) else end
+			if c < v:
+				x[lt], x[i] = s, x[lt]
+				lt += 1
+				i += 1
+			elif c > v:
+				x[i], x[gt] = x[gt], s
+				gt -= 1
+			else:
+				i += 1
+		chars += high - low
+		stack.append((low, lt, d))
+		stack.append((gt + 1, high, d))
+		if v != end: # strings that ended here are all equal
+			stack.append((lt, gt + 1, d + 1))
+	if stats is not None:
+		stats['chars'] = chars
+	return x
+
+class CountingString:
+	# Wraps a string and counts the characters a comparison sort
+	# looks at: the common prefix plus the first difference.
+	chars = 0
+	__slots__ = ('s',)
+	def __init__(self, s):
+		self.s = s
+	def __lt__(self, other):
+		a, b = self.s, other.s
+		CountingString.chars += common_prefix(a, b, 0) + 1
+		return a < b
+
+for strings in (['she', 'sells', 'seashells', 'by', 'the', 'sea', 'shore', 'the',
+                 'shells', 'she', 'sells', 'are', 'surely', 'seashells', '', 's'],
+                [b'acgt', b'acg', b'', b'tt', b'acga', b'acgt'] * 5):
+	assert string_sort(list(strings)) == sorted(strings)
+	assert string_sort(list(strings), cutoff=1) == sorted(strings)
+print(string_sort(['she', 'sells', 'seashells', 'by', 'the', 'sea', 'shore']))
+
+
+if __name__ == '__main__':
+	from random import choice, randrange
+	from time import perf_counter
+	genome = ''.join(choice('acgt') for _ in range(2000))
+	genome = genome * 5 # repeats give long shared prefixes
+	workloads = {
+		'urls': ['https://www.example.com/products/category-{}/item/{}?ref=search'
+		         .format(randrange(20), randrange(10**6)) for _ in range(10**5)],
+		'genome reads': [genome[i:i + 100] for i in
+		                 (randrange(len(genome) - 100) for _ in range(10**5))],
+		'genome bytes': [genome[i:i + 100].encode() for i in
+		                 (randrange(len(genome) - 100) for _ in range(10**5))],
+	}
+	print("data n algorithm seconds chars")
+	for name, data in workloads.items():
+		start = perf_counter()
+		string_sort(list(data))
+		seconds = perf_counter() - start
+		stats = {}
+		string_sort(list(data), stats=stats)
+		print(name, len(data), "string_sort", round(seconds, 3), stats['chars'])
+		start = perf_counter()
+		sorted(data)
+		seconds = perf_counter() - start
+		CountingString.chars = 0
+		sorted(map(CountingString, data))
+		print(name, len(data), "sorted", round(seconds, 3), CountingString.chars)
@@ -0,0 +1,120 @@
+
+## Parallel sample sort
+# With p worker processes, we pick p - 1 splitters from a random
+# sample of the input, so that about n / p elements fall between two
+# consecutive splitters. Every element then has a bucket, and if we
+# put the buckets one after another in the output and sort each of
+# them, the whole output is sorted; there is no final merge.
+#
+# The input and the output live in shared memory, so the workers read
+# and write them directly and a task is just a range of indices. We
+# need three rounds of tasks:
+#   1. each worker counts how many elements of its chunk of the input
+#      fall in each bucket;
+#   2. from the counts we work out where each chunk's part of each
+#      bucket goes in the output, and the workers copy them there;
+#   3. each worker sorts one bucket of the output.
+# For the local sorts we use numpy's sort, which is a radix sort for
+# small integer types and an introsort for the rest.
+
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from os import cpu_count
+
+worker_data = {}
+
+def init_worker(names, n, dtype, splitters):
+	worker_data['shm'] = [shared_memory.SharedMemory(name=name) for name in names]
+	src, dst = worker_data['shm']
+	worker_data['src'] = np.ndarray((n,), dtype=dtype, buffer=src.buf)
+	worker_data['dst'] = np.ndarray((n,), dtype=dtype, buffer=dst.buf)
+	worker_data['splitters'] = splitters
+
+def buckets(low, high):
+	return np.searchsorted(worker_data['splitters'], worker_data['src'][low:high],
+	                       side='right')
+
+def count_chunk(low, high):
+	return np.bincount(buckets(low, high), minlength=len(worker_data['splitters']) + 1)
+
+def distribute_chunk(low, high, offsets):
+	# offsets[j] is where this chunk's part of bucket j goes
+	b = buckets(low, high)
+	order = np.argsort(b, kind='stable')
+	chunk = worker_data['src'][low:high][order]
+	counts = np.bincount(b, minlength=len(offsets))
+	start = 0
+	for j, count in enumerate(counts):
+		worker_data['dst'][offsets[j]:offsets[j] + count] = chunk[start:start + count]
+		start += count
+
+def sort_bucket(low, high):
+	worker_data['dst'][low:high].sort()
+
+def choose_splitters(x, p, oversample = 64):
+	sample = np.sort(np.random.choice(x, size=min(len(x), p * oversample)))
+	return sample[len(sample) * np.arange(1, p) // p]
+
+def sample_sort(x, workers = None, mp_context = None):
+	# Returns a sorted copy of the numpy array x. mp_context picks
+	# how the workers are started, as for ProcessPoolExecutor.
+	x = np.asarray(x)
+	workers = workers or cpu_count() or 1
+	n = len(x)
+	if workers == 1 or n < 10**5:
+		return np.sort(x)
+	splitters = choose_splitters(x, workers)
+	shms = [shared_memory.SharedMemory(create=True, size=x.nbytes) for _ in range(2)]
+	try:
+		src = np.ndarray(x.shape, dtype=x.dtype, buffer=shms[0].buf)
+		src[:] = x
+		size = -(-n // workers) # n / workers, rounded up
+		chunks = [(low, min(low + size, n)) for low in range(0, n, size)]
+		with ProcessPoolExecutor(
+				max_workers=workers, mp_context=mp_context, initializer=init_worker,
+				initargs=([shm.name for shm in shms], n, x.dtype, splitters)
+		) as pool:
+			counts = np.array(list(pool.map(count_chunk, *zip(*chunks))))
+			# bucket j starts after all smaller buckets, and within
+			# bucket j, chunk i goes after chunks 0 to i - 1
+			bucket_sizes = counts.sum(axis=0)
+			bucket_starts = np.concatenate(([0], np.cumsum(bucket_sizes)[:-1]))
+			offsets = bucket_starts + np.cumsum(counts, axis=0) - counts
+			list(pool.map(distribute_chunk, *zip(*chunks), offsets))
+			ends = bucket_starts + bucket_sizes
+			list(pool.map(sort_bucket, bucket_starts, ends))
+		return np.ndarray(x.shape, dtype=x.dtype, buffer=shms[1].buf).copy()
+	finally:
+		for shm in shms:
+			shm.close()
+			shm.unlink()
+
+x = np.random.randint(0, 100, size=1000) # too small for a pool
+assert (sample_sort(x, workers=4) == np.sort(x)).all()
+
+
+if __name__ == '__main__':
+	# Under the spawn start method every worker imports this file
+	# again, and so does sort-benchmark.py, so the pools may only
+	# start here.
+	for dtype in (np.int64, np.float64, np.uint16):
+		x = (np.random.rand(300000) * 1000).astype(dtype)
+		assert (sample_sort(x, workers=4) == np.sort(x)).all()
+	x = np.zeros(200000, dtype=np.int32) # one bucket gets everything
+	assert (sample_sort(x, workers=3) == x).all()
+	print(sample_sort(np.random.randint(0, 100, size=10**5), workers=2)[:10])
+
+	from time import perf_counter
+	n = 10**7
+	x = np.random.randint(0, 2**62, size=n)
+	start = perf_counter()
+	np.sort(x)
+	base = perf_counter() - start
+	print("workers n seconds speedup")
+	print(1, n, round(base, 3), 1.0)
+	for workers in sorted({2, 4, 8, 16, 32, cpu_count() or 1} - {1}):
+		start = perf_counter()
+		sample_sort(x, workers)
+		seconds = perf_counter() - start
+		print(workers, n, round(seconds, 3), round(base / seconds, 2))
@@ -15,4 +15,150 @@ while low < high:
 	else:
 		high = mid
 
-print(found)
\ No newline at end of file
+print(found)
+
+
+## Searching for many keys at once
+# Looking up one key at a time, as above, costs a Python loop per
+# key. With the keys in a sorted numpy array and the queries in
+# another, we can do all the lookups at once. Like bisect_left and
+# bisect_right, search returns for each query the position where it
+# would go in x, either before or after the keys equal to it, so
+# with duplicates such as the two 2s in numbers, right minus left is
+# the number of copies and the query is in x if that is positive.
+#
+# np.searchsorted does the binary searches in C, but on a large x
+# almost every step of a search is a cache miss. If the queries are
+# sorted, neighbouring queries follow nearly the same path, so we
+# sort them first and put the answers back in the original order.
+#
+# The Eytzinger layout does better without sorting. We store x as a
+# complete binary search tree in breadth-first order, with the root
+# at index 1 and the children of k at 2k and 2k + 1, so the first
+# levels of every search are in the same few cache lines. A search
+# is then the same h steps k = 2k + (e[k] < q) for every query; no
+# branches, so we can take the step for a whole block of queries
+# with numpy. We fill the tree up to 2^h - 1 keys with copies of the
+# largest key, so it is perfect and the leaf we end in, k - 2^h, is
+# the position in x; anything past the end is cut down to len(x).
+
+import numpy as np
+
+sort_queries_from = 2**16 # sort the queries when x has this many keys
+
+def check_side(side):
+	if side not in ('left', 'right'):
+		raise ValueError("side must be 'left' or 'right'")
+
+def search(x, queries, side = 'left'):
+	check_side(side)
+	queries = np.asarray(queries)
+	if len(x) < sort_queries_from or len(queries) < 2:
+		return np.searchsorted(x, queries, side)
+	order = np.argsort(queries)
+	positions = np.empty(len(queries), dtype=np.intp)
+	positions[order] = np.searchsorted(x, queries[order], side)
+	return positions
+
+def contains(x, queries):
+	x = np.asarray(x)
+	positions = search(x, queries)
+	found = positions < len(x)
+	found[found] = x[positions[found]] == np.asarray(queries)[found]
+	return found
+
+class Eytzinger:
+	def __init__(self, x, block = 2**15):
+		self.n = n = len(x)
+		self.height = h = n.bit_length()
+		self.block = block
+		perfect = np.empty((1 << h) - 1, dtype=x.dtype)
+		perfect[:n] = x
+		perfect[n:] = x[-1] if n else 0
+		# depth d holds every 2^(h-d)-th key, from the 2^(h-d-1)-th
+		self.tree = np.zeros(1 << h, dtype=x.dtype)
+		for d in range(h):
+			self.tree[1 << d:1 << (d + 1)] = perfect[(1 << (h - d - 1)) - 1::1 << (h - d)]
+
+	def descend(self, queries, step):
+		# the leaf, between 2^h and 2^(h+1), that each query ends in
+		leaves = np.empty(len(queries), dtype=np.intp)
+		for start in range(0, len(queries), self.block):
+			q = queries[start:start + self.block]
+			k = np.ones(len(q), dtype=np.intp)
+			for _ in range(self.height):
+				k = 2 * k + step(self.tree[k], q)
+			leaves[start:start + len(q)] = k
+		return leaves
+
+	def search(self, queries, side = 'left'):
+		check_side(side)
+		step = np.less if side == 'left' else np.less_equal
+		positions = self.descend(np.asarray(queries), step) - (1 << self.height)
+		return np.minimum(positions, self.n, out=positions)
+
+	def contains(self, queries):
+		# The last node where we went left holds the first key >= q.
+		# Going left appends a 0 bit to k and going right a 1, so we
+		# find it by removing the trailing 1s and the 0 before them.
+		queries = np.asarray(queries)
+		k = self.descend(queries, np.less)
+		k //= 2 * (~k & (k + 1))
+		return (k > 0) & (self.tree[k] == queries)
+
+
+x = np.array(numbers)
+queries = np.array([0, 1, 2, 3, 5, 6])
+print(search(x, queries), search(x, queries, 'right'))
+print(contains(x, queries))
+tree = Eytzinger(x)
+print(tree.tree[1:], tree.search(queries), tree.search(queries, 'right'))
+print(tree.contains(queries))
+
+import bisect
+rng = np.random.default_rng(1)
+for n in list(range(20)) + [100, 1000, 2**16 + 3]:
+	x = np.sort(rng.integers(0, n // 2 + 1, size=n))
+	queries = rng.integers(-1, n // 2 + 2, size=500)
+	tree = Eytzinger(x)
+	left = [bisect.bisect_left(x, q) for q in queries]
+	right = [bisect.bisect_right(x, q) for q in queries]
+	member = [q in x for q in queries]
+	assert list(search(x, queries)) == left and list(tree.search(queries)) == left
+	assert list(search(x, queries, 'right')) == right
+	assert list(tree.search(queries, 'right')) == right
+	assert list(contains(x, queries)) == member and list(tree.contains(queries)) == member
+	assert list(contains(x.tolist(), queries.tolist())) == member
+x = np.sort(rng.random(1000))
+queries = np.concatenate((x[::7], rng.random(100)))
+assert (Eytzinger(x).search(queries) == np.searchsorted(x, queries)).all()
+assert Eytzinger(x).contains(queries)[:len(x[::7])].all()
+
+
+if __name__ == '__main__':
+	from time import perf_counter
+	m = 10**7
+	print("n method seconds lookups_per_second")
+	for n in (10**3, 10**5, 10**6, 10**7):
+		x = np.sort(rng.integers(0, 2**40, size=n))
+		queries = rng.integers(0, 2**40, size=m)
+		start = perf_counter()
+		np.searchsorted(x, queries)
+		seconds = perf_counter() - start
+		print(n, "np.searchsorted", round(seconds, 3), int(m / seconds))
+		start = perf_counter()
+		search(x, queries)
+		seconds = perf_counter() - start
+		print(n, "search", round(seconds, 3), int(m / seconds))
+		start = perf_counter()
+		tree = Eytzinger(x)
+		seconds = perf_counter() - start
+		print(n, "eytzinger_build", round(seconds, 3), None)
+		start = perf_counter()
+		tree.search(queries)
+		seconds = perf_counter() - start
+		print(n, "eytzinger", round(seconds, 3), int(m / seconds))
+		start = perf_counter()
+		tree.contains(queries)
+		seconds = perf_counter() - start
+		print(n, "eytzinger_contains", round(seconds, 3), int(m / seconds))
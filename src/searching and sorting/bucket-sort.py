@@ -62,3 +62,132 @@ for key in range(m):
 
 print(result_keys)
 print(result_values)
+
+
+## Counting sort with the key range found from the data
+# Rather than fixing m, we find the smallest and largest key in one
+# pass and use a bucket per key in between. If we only have keys, a
+# count per bucket is all we need, and we write each key out count
+# times. If we sort records by key_fun, as in gen-sort.py, we turn the
+# counts into start positions with a prefix sum and move each record
+# to its place, which keeps records with equal keys in order. Either
+# way the output is allocated once. If the keys are spread over a
+# range much larger than the number of keys, most buckets would be
+# empty, and a comparison sort is faster; the same goes for keys that
+# are not integers.
+
+import numpy as np
+
+def key_range(keys):
+	lo = hi = keys[0]
+	for k in keys:
+		if k < lo: lo = k
+		elif k > hi: hi = k
+	return lo, hi
+
+def counting_sort(x, key_fun = None, max_range = 4):
+	# Returns a sorted copy of x. We fall back to sorted() when the
+	# key range is more than max_range times the number of elements.
+	# A numpy array gives a numpy array back.
+	n = len(x)
+	if isinstance(x, np.ndarray) and key_fun is not None:
+		# sort the positions by the keys, and take the elements in that order
+		keys = [key_fun(e) for e in x]
+		order = counting_sort(list(range(n)), keys.__getitem__, max_range)
+		return x[np.array(order, dtype=np.intp)]
+	if n == 0:
+		return x.copy() if isinstance(x, np.ndarray) else x[:]
+	if isinstance(x, np.ndarray) and x.dtype.kind not in 'iu':
+		return np.sort(x)
+	if isinstance(x, np.ndarray):
+		lo, hi = int(x.min()), int(x.max())
+		if hi - lo + 1 > max_range * n or hi > np.iinfo(np.intp).max:
+			return np.sort(x)
+		# x - lo in x's own dtype wraps around for int8 and int16
+		counts = np.bincount(x.astype(np.intp) - lo, minlength=hi - lo + 1)
+		return np.repeat(np.arange(lo, hi + 1, dtype=x.dtype), counts)
+
+	keys = x if key_fun is None else [key_fun(e) for e in x]
+	lo, hi = key_range(keys)
+	if not (isinstance(lo, int) and isinstance(hi, int)) or hi - lo + 1 > max_range * n:
+		return sorted(x, key=key_fun)
+	counts = [0] * (hi - lo + 1)
+	try:
+		for k in keys:
+			counts[k - lo] += 1
+	except TypeError: # not all keys are integers
+		return sorted(x, key=key_fun)
+
+	if key_fun is None and set(map(type, keys)) == {int}:
+		# plain ints we can rebuild from the range; subclasses such as
+		# bool and IntEnum must be scattered as themselves below
+		result = [None] * n
+		i = 0
+		for key, count in enumerate(counts, lo):
+			result[i:i + count] = [key] * count
+			i += count
+		return result
+
+	start = 0
+	for b in range(len(counts)):
+		counts[b], start = start, start + counts[b]
+	result = [None] * n
+	for e, k in zip(x, keys):
+		result[counts[k - lo]] = e
+		counts[k - lo] += 1
+	return result
+
+print(counting_sort([1,3,2,4,6,5]))
+print(counting_sort([-3, 10, 4, 4, -3, 0]))
+fruits = ["apple", "orange", "bananba", "kiwi"]
+print(counting_sort(fruits, key_fun = len))
+print(counting_sort([10**9, 1, 5]), counting_sort([2.5, 1, 3]))
+print(counting_sort(np.array([3, 1, 2, 1, 0, 3])))
+
+from random import randrange
+for n in range(0, 100, 7):
+	keys = [randrange(-10, 10) for _ in range(n)]
+	assert counting_sort(keys) == sorted(keys)
+	records = [(k, i) for i, k in enumerate(keys)]
+	assert counting_sort(records, key_fun = lambda r: r[0]) == sorted(records)
+	assert list(counting_sort(np.array(keys, dtype=int))) == sorted(keys)
+for x in (np.array([1.5, 0.5]), np.array([]), np.array(['b', 'a'])):
+	assert isinstance(counting_sort(x), np.ndarray)
+	assert list(counting_sort(x)) == sorted(x)
+x = np.array([15, 3, 22, 7, 10])
+assert list(counting_sort(x, key_fun = lambda e: e % 5)) == [15, 10, 22, 7, 3]
+from enum import IntEnum
+Colour = IntEnum('Colour', 'RED GREEN BLUE')
+x = [Colour.BLUE, Colour.RED, Colour.GREEN, Colour.RED]
+assert [type(b) for b in counting_sort([True, False, True])] == [bool] * 3
+assert all(type(c) is Colour for c in counting_sort(x))
+assert counting_sort(x) == sorted(x)
+for x in (np.arange(-128, 128, dtype=np.int8)[::-1],
+          np.random.randint(-30000, 30001, size=10**5).astype(np.int16),
+          np.array([2**64 - 1, 2**64 - 3, 2**64 - 2], dtype=np.uint64)):
+	assert np.array_equal(counting_sort(x), np.sort(x))
+
+
+if __name__ == '__main__':
+	from time import perf_counter
+	print("n algorithm seconds")
+	for n in (10**5, 10**6, 10**7):
+		x = np.random.randint(0, 1000, size=n)
+		start = perf_counter()
+		counting_sort(x)
+		print(n, "counting numpy", round(perf_counter() - start, 3))
+		start = perf_counter()
+		np.sort(x)
+		print(n, "np.sort", round(perf_counter() - start, 3))
+		if n <= 10**6:
+			y = x.tolist()
+			start = perf_counter()
+			counting_sort(y)
+			print(n, "counting list", round(perf_counter() - start, 3))
+			records = [(k, i) for i, k in enumerate(y)]
+			start = perf_counter()
+			counting_sort(records, key_fun = lambda r: r[0])
+			print(n, "counting records", round(perf_counter() - start, 3))
+			start = perf_counter()
+			sorted(y)
+			print(n, "sorted", round(perf_counter() - start, 3))
@@ -58,7 +58,11 @@ def factorial(n):
 print("tail recursive wrong")
 print(factorial(3))
 
-def bsearch(x, e, low = 0, high = len(x)):
+def bsearch(x, e, low = 0, high = None):
+	# high = len(x) as a default would be the length of the global x
+	# when the function was defined, not of the list we search
+	if high is None:
+		high = len(x)
 	if low >= high:
 		return False
 	mid = (low + high) // 2
@@ -290,3 +294,329 @@ print(smallest)
 
 
 
+
+
+## Tail calls, automatically
+# Above we rewrote tail-recursive functions into loops by hand:
+# the parameters become variables, a tail call assigns the new
+# arguments to them, and we go around the loop again. The
+# tail_recursive decorator does the same rewrite on the syntax tree
+# of the function when it is defined, so we only have to write the
+# recursive version.
+#
+# A self-call in a return statement inside a for or while loop in
+# the function can't become a continue, and tail calls to other
+# functions, as in mutual recursion, can't become a loop at all.
+# For those we fall back to the trampolined decorator of
+# trampoline.py: while the function is running, calls to it return a
+# Bounce, and the outermost call runs them in a loop.
+# Only tail calls to other trampolined functions need that. We can't
+# always check the target when we decorate, since in mutual recursion
+# the other function isn't defined yet, so a name that isn't defined
+# counts as one; builtins and plain functions don't.
+#
+# The loop only behaves like the recursion if nothing carries over
+# from one round to the next. We also fall back if a tail call unpacks
+# its arguments with * or **, and if a local variable may be read
+# before it is assigned, since in the loop it would still hold its
+# value from the round before. A return inside a try or with block
+# is not a tail call at all, as the cleanup runs after the call, so
+# it counts as any other call.
+#
+# A trampolined function must only be called in tail position while
+# its loop runs, so we don't trampoline a function that calls itself
+# or its targets anywhere else. If such a target was trampolined
+# before this function was defined, we turn its trampoline off.
+
+import ast
+import inspect
+import textwrap
+import builtins
+from functools import wraps
+from loader import load
+
+trampolined = load('trampoline.py').trampolined
+
+def find_tail_calls(fdef):
+	# Returns the return statements with self tail calls, whether
+	# any of them can't become a continue, whether the function calls
+	# itself anywhere else, and the names of the other functions it
+	# calls in tail position and elsewhere. A return inside a try or
+	# with block is not a tail call, since the cleanup runs after the
+	# call returns.
+	name = fdef.name
+	self_calls, blocked, other_self = [], False, False
+	tail_names, other_names = set(), set()
+	def is_call(node):
+		return isinstance(node, ast.Call) and isinstance(node.func, ast.Name)
+	def unpacks(call):
+		return (any(isinstance(a, ast.Starred) for a in call.args) or
+		        any(k.arg is None for k in call.keywords))
+	def visit(node, loop_depth, guard_depth):
+		nonlocal blocked, other_self
+		if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef,
+		                     ast.Lambda, ast.ClassDef)):
+			return # calls in nested functions are not our calls
+		tail = (isinstance(node, ast.Return) and is_call(node.value)
+		        and guard_depth == 0)
+		if tail:
+			call = node.value
+			if call.func.id == name:
+				self_calls.append(node)
+				blocked = blocked or loop_depth > 0 or unpacks(call)
+			else:
+				tail_names.add(call.func.id)
+			children = call.args + [k.value for k in call.keywords]
+		else:
+			if is_call(node):
+				if node.func.id == name:
+					other_self = True
+				else:
+					other_names.add(node.func.id)
+			children = list(ast.iter_child_nodes(node))
+		if isinstance(node, (ast.For, ast.AsyncFor, ast.While)):
+			loop_depth += 1
+		if isinstance(node, (ast.Try, ast.With, ast.AsyncWith)):
+			guard_depth += 1
+		for child in children:
+			visit(child, loop_depth, guard_depth)
+	for stmt in fdef.body:
+		visit(stmt, 0, 0)
+	return self_calls, blocked, other_self, tail_names, other_names
+
+def reads_stale_locals(fdef, params):
+	# In the loop, a local variable keeps its value from the previous
+	# round, where the recursive call would have started without it.
+	# That can only matter if the local may be read before it is
+	# assigned, so we only accept locals that are assigned by a
+	# statement at the top of the body before anything reads them.
+	stored, declared = set(), set()
+	for node in ast.walk(fdef):
+		if isinstance(node, ast.Name) and not isinstance(node.ctx, ast.Load):
+			stored.add(node.id)
+		elif isinstance(node, (ast.Global, ast.Nonlocal)):
+			declared.update(node.names)
+	local = stored - declared - set(params)
+	assigned = set()
+	for stmt in fdef.body:
+		read = {node.id for node in ast.walk(stmt)
+		        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load)}
+		if isinstance(stmt, ast.AugAssign) and isinstance(stmt.target, ast.Name):
+			read.add(stmt.target.id)
+		if (read & local) - assigned:
+			return True
+		if isinstance(stmt, (ast.Assign, ast.AnnAssign, ast.AugAssign)):
+			assigned.update(node.id for node in ast.walk(stmt)
+			                if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Store))
+	return False
+
+def rewrite_tail_call(ret, params):
+	# return f(a, b) becomes: x, y = a, b ; continue
+	call = ret.value
+	values = dict(zip(params, call.args))
+	for keyword in call.keywords:
+		values[keyword.arg] = keyword.value
+	targets, exprs = [], []
+	for p in params:
+		targets.append(ast.Name(p, ast.Store()))
+		if p in values:
+			exprs.append(values[p])
+		else: # missing arguments get their defaults again
+			exprs.append(ast.Subscript(ast.Name('__tail_defaults__', ast.Load()),
+			                           ast.Constant(p), ast.Load()))
+	assign = ast.Assign([ast.Tuple(targets, ast.Store())],
+	                    ast.Tuple(exprs, ast.Load()))
+	return [ast.copy_location(assign, ret), ast.copy_location(ast.Continue(), ret)]
+
+class TailCallRewriter(ast.NodeTransformer):
+	def __init__(self, calls, params):
+		self.calls = calls
+		self.params = params
+	def visit_Return(self, node):
+		if node in self.calls:
+			return rewrite_tail_call(node, self.params)
+		return node
+
+def bounces(f, name):
+	# Does a tail call from f to name go to a trampolined function?
+	if name in f.__globals__:
+		return getattr(f.__globals__[name], 'trampolined', False)
+	return not hasattr(builtins, name)
+
+def tail_recursive(f):
+	try:
+		source = textwrap.dedent(inspect.getsource(f))
+	except (OSError, TypeError):
+		return f
+	fdef = ast.parse(source).body[0]
+	fdef.decorator_list = []
+	self_calls, blocked, other_self, tail_names, other_names = find_tail_calls(fdef)
+	targets = {name for name in tail_names if bounces(f, name)}
+	# A trampolined function returns a Bounce to every call made while
+	# its loop runs, so we only trampoline if the function and its
+	# targets are called in tail position and nowhere else.
+	other_tail = bool(targets)
+	trampoline_ok = not other_self and not targets & other_names
+	for name in targets & other_names:
+		# a partner decorated before we knew how we call it
+		if name in f.__globals__:
+			f.__globals__[name].trampolined = False
+	args = fdef.args
+	params = [a.arg for a in args.args]
+	simple = (not args.vararg and not args.kwarg and not args.kwonlyargs
+	          and not args.posonlyargs and not f.__code__.co_freevars)
+	if not self_calls or blocked or not simple or reads_stale_locals(fdef, params):
+		if (self_calls or other_tail) and trampoline_ok:
+			return trampolined(f)
+		return f
+
+	defaults = dict(zip(params[len(params) - len(f.__defaults__ or ()):],
+	                    f.__defaults__ or ()))
+	rewriter = TailCallRewriter(self_calls, params)
+	body = [rewriter.visit(stmt) for stmt in fdef.body]
+	body = [s for stmt in body for s in (stmt if isinstance(stmt, list) else [stmt])]
+	# falling off the end of the body returns None; it must not loop
+	body.append(ast.Return(ast.Constant(None)))
+	fdef.body = [ast.While(ast.Constant(True), body, [])]
+	fdef.args.defaults = []
+	# Wrap the new function in a factory, so __tail_defaults__ is a
+	# closure variable and the globals are those of the original.
+	factory = ast.FunctionDef(
+		'__tail_factory__',
+		ast.arguments([], [ast.arg('__tail_defaults__')], None, [], [], None, []),
+		[fdef, ast.Return(ast.Name(fdef.name, ast.Load()))], [])
+	module = ast.fix_missing_locations(ast.Module([factory], []))
+	ast.increment_lineno(module, f.__code__.co_firstlineno - 1)
+	namespace = {}
+	exec(compile(module, f.__code__.co_filename, 'exec'), f.__globals__, namespace)
+	g = namespace['__tail_factory__'](defaults)
+	g.__defaults__ = f.__defaults__
+	g = wraps(f)(g)
+	if other_tail and trampoline_ok:
+		g = trampolined(g)
+	return g
+
+@tail_recursive
+def linear_search(x, e, i = 0):
+	if i == len(x):
+		return False
+	if e == x[i]:
+		return True
+	else:
+		return linear_search(x, e, i + 1)
+
+@tail_recursive
+def factorial(n, acc = 1):
+	if n == 1:
+		return acc
+	else:
+		return factorial(n - 1, n * acc)
+
+@tail_recursive
+def bsearch(x, e, low = 0, high = None):
+	if high is None:
+		high = len(x)
+	if low >= high:
+		return False
+	mid = (low + high) // 2
+	if x[mid] == e:
+		return True
+	elif x[mid] < e:
+		return bsearch(x, e, mid + 1, high)
+	else:
+		return bsearch(x, e, low, mid)
+
+@tail_recursive
+def merge(x, y, i = 0, j = 0, acc = None):
+	if acc is None:
+		acc = []
+	if i == len(x):	
+		return acc + y[j:]
+	if j == len(y):	
+		return acc + x[i:]
+	if x[i] < y[j]:
+		return merge(x, y, i + 1, j, app(acc, x[i]))
+	else:
+		return merge(x, y, i, j + 1, app(acc, y[j]))
+
+@tail_recursive
+def is_even(n):
+	if n == 0:
+		return True
+	return is_odd(n - 1)
+
+@tail_recursive
+def is_odd(n):
+	if n == 0:
+		return False
+	return is_even(n - 1)
+
+print("tail calls eliminated")
+big = list(range(10**5))
+print(linear_search(big, 10**5 - 1), linear_search(big, -1))
+print(factorial(5), factorial(10**4).bit_length())
+print(bsearch(big, 12345), bsearch(big, -3))
+print(len(merge(big, big)))
+print(is_even(10**5), is_odd(10**5))
+
+@tail_recursive
+def collect(n, acc = None):
+	if acc is None:
+		acc = []
+	if n == 0:
+		return sorted(acc)
+	return collect(n - 1, app(acc, n))
+
+@tail_recursive
+def factorial_kw(n, *, acc = 1):
+	if n == 1:
+		return acc
+	return factorial_kw(n - 1, acc = n * acc)
+
+print(collect(3), collect(n = 3), factorial_kw(5))
+
+def spread(a, b = 0, c = 0):
+	if a == 0:
+		return (a, b, c)
+	more = {'b': b + 1, 'c': c + 10}
+	return spread(a - 1, **more)
+assert tail_recursive(spread)(3) == spread(3) == (0, 3, 30)
+
+log = []
+def logged(n):
+	try:
+		if n == 0:
+			return 0
+		return logged(n - 1)
+	finally:
+		log.append(n)
+tail_recursive(logged)(3)
+assert log == [0, 1, 2, 3]
+
+def scaled(n, acc = 1):
+	if n == 0:
+		return acc
+	if n == 2:
+		scale = 2
+	try:
+		acc *= scale
+	except NameError: # scale is only set in the round with n == 2
+		pass
+	return scaled(n - 1, acc * n)
+assert tail_recursive(scaled)(3) == scaled(3) == 12
+
+@tail_recursive
+def ping(n):
+	if n == 0:
+		return 0
+	return pong(n - 1)
+
+@tail_recursive
+def pong(n):
+	if n == 0:
+		return 0
+	if n % 5 == 0:
+		return 1 + ping(n - 1)
+	return ping(n - 1)
+
+print(ping(20))
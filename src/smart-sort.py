@@ -0,0 +1,195 @@
+
+## Choosing a sort from the input
+# quadraitic-sort-comparison.py shows that which sort is fastest
+# depends on the input: insertion sort is linear on sorted input and
+# quadratic on reversed input, while selection sort doesn't care. So
+# before we sort, we look at the input once and measure:
+#   - descents, the number of i where x[i] <= x[i + 1] is false;
+#     there are descents + 1 ascending runs, and no descents means x
+#     is sorted;
+#   - ascents, the same the other way; no ascents means x is sorted
+#     in reverse, and we only have to turn it around;
+#   - an estimate of the number of inversions, pairs i < j with
+#     x[i] > x[j], from a random sample of pairs;
+#   - the smallest and largest key and what kind of keys we have.
+#
+# When the input has few runs, we want a sort that merges the runs
+# and inserts the few elements out of place; that is timsort, which
+# is sorted() for lists and the stable sort for numpy arrays, and it
+# runs in C. Written in Python, insertion sort and run merging lose
+# to it even on tiny or almost sorted lists. On other input, numpy's
+# default introsort is several times faster than timsort, also on 8
+# and 16 bit integers where the stable sort is a radix sort. The
+# exception is integers in a range smaller than n, which we sort with
+# counting_sort from bucket-sort.py. We use numpy for all arrays and
+# for lists of ints or of floats, which we copy into an array and
+# back; lists of anything else go to sorted(). The inversions we only
+# report; a handful of sampled pairs can tell a random input from a
+# sorted one, but the runs already tell us that.
+#
+# We count x[i] <= x[i + 1] being false rather than x[i] > x[i + 1]
+# being true, because every comparison with a NaN is false: [3, NaN,
+# 1] would have no descents and look sorted. This way NaN breaks the
+# runs, and a float array with NaN goes to np.sort, which puts the
+# NaNs last.
+#
+# smart_sort returns a sorted copy. If stats is a dict, we put the
+# features we measured and the algorithm we picked in it, so callers
+# can log why their input was sorted the way it was.
+
+import numpy as np
+from operator import le, ge, countOf
+from itertools import islice
+from random import randrange
+from loader import load
+
+counting_sort = load('searching and sorting/bucket-sort.py').counting_sort
+
+max_range = 0.25    # counting sort if the key range is at most max_range * n
+few_runs = 8        # merge runs if there are at most n / few_runs of them
+inversion_pairs = 64 # pairs we sample to estimate the inversions
+
+def count_pairs(x, op):
+	# the number of i where op(x[i], x[i + 1]) is false
+	if isinstance(x, np.ndarray):
+		return len(x) - 1 - int(np.count_nonzero(op(x[:-1], x[1:])))
+	return countOf(map(op, x, islice(x, 1, None)), False)
+
+def estimate_inversions(x, samples = inversion_pairs):
+	n = len(x)
+	inverted = 0
+	for _ in range(samples):
+		i, j = randrange(n), randrange(n)
+		if i > j: i, j = j, i
+		inverted += x[i] > x[j]
+	return inverted * n * (n - 1) // (2 * samples)
+
+def as_numbers(x):
+	# A numpy copy of a list of ints or of floats, or None if the
+	# list holds anything else or ints too large for 64 bits.
+	types = set(map(type, x))
+	try:
+		if types == {int}:
+			return np.fromiter(x, dtype=np.int64, count=len(x))
+		if types == {float}:
+			return np.fromiter(x, dtype=np.float64, count=len(x))
+	except OverflowError:
+		pass
+	return None
+
+def features(x):
+	# Returns the features of x and x as a numpy array, if it is one
+	# or we could make it one, or None.
+	n = len(x)
+	f = {'n': n, 'type': 'array' if isinstance(x, np.ndarray) else 'list'}
+	f['descents'] = count_pairs(x, le) if n > 1 else 0
+	f['runs'] = f['descents'] + 1
+	if f['descents'] == 0:
+		return f, None
+	f['ascents'] = count_pairs(x, ge)
+	if f['ascents'] == 0:
+		return f, None
+	f['inversions'] = estimate_inversions(x)
+	if f['runs'] * few_runs <= n:
+		return f, None # timsort will merge the runs, whatever the keys
+	keys = x if f['type'] == 'array' else as_numbers(x)
+	f['dtype'] = str(keys.dtype) if keys is not None else 'object'
+	if keys is not None and keys.dtype.kind in 'iu':
+		f['min'], f['max'] = int(keys.min()), int(keys.max())
+	return f, keys
+
+def choose(f, keys):
+	n = f['n']
+	if f['descents'] == 0:
+		return 'none'
+	if f['ascents'] == 0:
+		return 'reverse'
+	if f['runs'] * few_runs <= n:
+		return 'merge runs'
+	if 'min' in f and f['max'] - f['min'] + 1 <= max_range * n \
+	   and f['max'] <= np.iinfo(np.intp).max: # counting_sort leaves those to np.sort
+		return 'counting'
+	if keys is not None:
+		return 'introsort'
+	return 'sorted'
+
+def smart_sort(x, stats = None):
+	f, keys = features(x)
+	algorithm = choose(f, keys)
+	if stats is not None:
+		stats.update(f)
+		stats['algorithm'] = algorithm
+
+	array = isinstance(x, np.ndarray)
+	if algorithm == 'none':
+		return x.copy() if array else list(x)
+	if algorithm == 'reverse':
+		return x[::-1].copy() if array else list(reversed(x))
+	if algorithm == 'merge runs':
+		return np.sort(x, kind='stable') if array else sorted(x)
+	if algorithm == 'sorted':
+		return sorted(x)
+	if algorithm == 'counting':
+		result = counting_sort(keys)
+	else:
+		result = np.sort(keys)
+	return result if array else result.tolist()
+
+stats = {}
+print(smart_sort([3, 1, 2, 5, 4], stats), stats['algorithm'])
+for x in ([], [1], [1, 2, 3], [3, 2, 2, 1], list(range(100)) + [0],
+		  [10**9, -5, 7, 7, 0], [2.5, 1, 3], ["kiwi", "apple", "fig"],
+		  np.array([5, 3, 3, 1]), np.random.rand(50),
+		  np.random.randint(-2**15, 2**15, size=10**6).astype(np.int16),
+		  [2**70, 1, 0, 5], [True, False, True]):
+	stats = {}
+	y = smart_sort(x, stats)
+	assert list(y) == sorted(x), (x, stats)
+	assert type(y) == type(x)
+	print(stats['algorithm'], stats['n'])
+
+for n in range(0, 300, 17):
+	for x in ([randrange(-n, n + 1) for _ in range(n)],
+			  [randrange(10**12) for _ in range(n)],
+			  sorted(randrange(10**6) for _ in range(n))[::-1]):
+		assert smart_sort(x) == sorted(x)
+		assert list(smart_sort(np.array(x, dtype=np.int64))) == sorted(x)
+
+nan = float('nan')
+for x in ([3.0, nan, 1.0], [nan, 2.0, 1.0], [1.0, 2.0, nan],
+          np.r_[np.arange(1000.0), nan, np.arange(1000.0)]):
+	x = np.array(x)
+	assert np.array_equal(smart_sort(x), np.sort(x), equal_nan=True)
+
+x = np.uint64(2**64 - 1) - np.arange(300, dtype=np.uint64) % 3
+assert np.array_equal(smart_sort(x), np.sort(x))
+
+
+if __name__ == '__main__':
+	from time import perf_counter
+	n = 10**6
+	permuted = np.random.permutation(n) * 1000
+	almost = np.arange(n) * 1000
+	for i in np.random.randint(0, n - 1, size=n // 100):
+		almost[i], almost[i + 1] = almost[i + 1], almost[i]
+	inputs = {
+		'sorted': np.arange(n) * 1000,
+		'reversed': np.arange(n)[::-1] * 1000,
+		'permuted': permuted,
+		'almost_sorted': almost,
+		'few_unique': np.random.randint(0, 100, size=n),
+		'int16': np.random.randint(-2**15, 2**15, size=n).astype(np.int16),
+		'floats': np.random.rand(n),
+	}
+	print("input type n algorithm seconds sorted_seconds")
+	for name, x in inputs.items():
+		for data, kind in ((x, 'array'), (x.tolist(), 'list')):
+			stats = {}
+			start = perf_counter()
+			smart_sort(data, stats)
+			seconds = perf_counter() - start
+			start = perf_counter()
+			np.sort(data) if kind == 'array' else sorted(data)
+			base = perf_counter() - start
+			print(name, kind, n, stats['algorithm'].replace(' ', '_'),
+				  round(seconds, 3), round(base, 3))
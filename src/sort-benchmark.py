@@ -0,0 +1,264 @@
+
+## Benchmarking the sorts
+# quadraitic-sort-comparison.py counts comparisons and swaps for
+# inputs of fewer than 100 elements and prints them, and the figure
+# scripts read the printed columns back by position. Here we run all
+# the sorts in src/ on the same inputs, from tiny to as large as each
+# of them can handle, and for every run we record
+#   - the time, the best of a few repeats when a run is quick;
+#   - the peak memory allocated while sorting, from tracemalloc;
+#   - for sorts of lists, the number of comparisons, reads, writes
+#     and swaps, by sorting elements and a list that count them.
+# The records go to CSV or JSON with named columns.
+#
+# We don't know in advance how large an input a sort can take, so we
+# try sizes 10, 100, ... up to the sort's max_n, and stop early when
+# a run takes more than time_limit seconds; the next size would take
+# at least ten times longer. From the times we fit t = c * n^k by
+# least squares on log t against log n. We expect k = 1 for linear
+# sorts, a little more for n log n sorts and 2 for quadratic ones, so
+# a k that grows from one version to the next is a regression.
+#
+# We count what the sorts do with instrument.py, and load the scripts
+# with loader.py. heapify.py is not a sort yet, so it is not on the
+# list.
+
+import numpy as np
+import io, contextlib, csv, json
+import tracemalloc
+import multiprocessing
+from time import perf_counter
+from instrument import instrument
+from loader import load
+
+
+## Inputs
+# The four inputs of quadraitic-sort-comparison.py, plus keys with
+# only a few distinct values. All keys are integers in [0, n), so
+# every sort, including radix and counting sort, can take them.
+
+def sorted_input(n, rng):
+	return np.arange(n)
+
+def reversed_input(n, rng):
+	return np.arange(n)[::-1].copy()
+
+def permuted_input(n, rng):
+	return rng.permutation(n)
+
+def almost_sorted_input(n, rng):
+	x = np.arange(n)
+	m = n // 10 # 10%
+	i, j = rng.integers(0, n, m), rng.integers(0, n, m)
+	for a, b in zip(i, j):
+		x[a], x[b] = x[b], x[a]
+	return x
+
+def few_unique_input(n, rng):
+	return rng.integers(0, min(n, 16), n) if n else np.arange(0)
+
+inputs = {
+	'sorted': sorted_input,
+	'reversed': reversed_input,
+	'permuted': permuted_input,
+	'almost_sorted': almost_sorted_input,
+	'few_unique': few_unique_input,
+}
+
+
+## Sorts
+# Each sort is a name, a function that returns the sorted keys, what
+# it wants as input, a list of Python ints or a numpy array, the
+# largest n we try, and whether it compares elements. The function
+# gets its own copy of the input, so it may sort in place.
+
+class Sort:
+	def __init__(self, name, fun, takes, max_n, compares):
+		self.name, self.fun, self.takes = name, fun, takes
+		self.max_n, self.compares = max_n, compares
+
+def quadratic_sort(fun):
+	def sort(x):
+		with contextlib.redirect_stdout(io.StringIO()):
+			return fun(x)
+	return sort
+
+def load_sorts():
+	quadratic = load('quadraitic-sort-comparison.py')
+	merge = load('merge-sort.py')
+	radix = load('radix-sort.py')
+	bucket = load('searching and sorting/bucket-sort.py')
+	smart = load('smart-sort.py')
+	sample = load('sample-sort.py')
+	sorts = [
+		Sort(name, quadratic_sort(getattr(quadratic, name + '_sort')), 'list', 10**4, True)
+		for name in ('selection', 'insertion', 'bubble', 'cocktail')
+	]
+	sorts += [
+		Sort('merge_sort', merge.merge_sort, 'list', 10**6, True),
+		Sort('merge_sort_alternate', merge.merge_sort_alternate, 'list', 10**7, True),
+		Sort('merge_sort_natural', merge.merge_sort_natural, 'list', 10**7, True),
+		Sort('radix_sort', radix.radix_sort, 'array', 10**7, False),
+		Sort('counting_sort', bucket.counting_sort, 'list', 10**7, False),
+		Sort('counting_sort_numpy', bucket.counting_sort, 'array', 10**7, False),
+		Sort('smart_sort', smart.smart_sort, 'list', 10**7, False),
+		Sort('smart_sort_numpy', smart.smart_sort, 'array', 10**7, False),
+	]
+	# The sample sort workers look up its functions in the module we
+	# loaded, which only processes started by fork have.
+	if 'fork' in multiprocessing.get_all_start_methods():
+		fork = multiprocessing.get_context('fork')
+		sorts.append(Sort('sample_sort',
+		                  lambda x: sample.sample_sort(x, mp_context=fork),
+		                  'array', 10**7, False))
+	sorts += [
+		Sort('sorted', sorted, 'list', 10**7, True),
+		Sort('np.sort', np.sort, 'array', 10**7, False),
+	]
+	return sorts
+
+
+## Measuring
+
+columns = ['input', 'n', 'algorithm', 'seconds', 'peak_bytes',
+		   'comparisons', 'reads', 'writes', 'swaps']
+
+def as_input(x, sort):
+	return x.tolist() if sort.takes == 'list' else x.copy()
+
+def is_sorted(x):
+	x = np.asarray(x)
+	return bool(np.all(x[:-1] <= x[1:]))
+
+def time_sort(sort, x, repeats, budget = 1.0):
+	# The best of up to repeats runs, but we don't start another run
+	# once we have spent budget seconds.
+	best, spent = float('inf'), 0.0
+	for _ in range(repeats):
+		y = as_input(x, sort)
+		start = perf_counter()
+		result = sort.fun(y)
+		seconds = perf_counter() - start
+		best, spent = min(best, seconds), spent + seconds
+		if spent > budget:
+			break
+	assert len(result) == len(x) and is_sorted(result), sort.name
+	return best
+
+def peak_memory(sort, x):
+	y = as_input(x, sort)
+	tracemalloc.start()
+	sort.fun(y)
+	peak = tracemalloc.get_traced_memory()[1]
+	tracemalloc.stop()
+	return peak
+
+def count_operations(sort, x, sample = 10**5):
+	# Above sample elements, we only wrap some elements, for an
+	# estimate of the comparisons at a fraction of the overhead.
+	rate = min(1.0, sample / max(len(x), 1))
+	with contextlib.redirect_stdout(io.StringIO()): # the quadratic sorts print
+		_, counts = instrument(sort.fun, x.tolist(), rate, keys=sort.compares)
+	if not sort.compares:
+		counts['comparisons'] = None
+	return counts
+
+def benchmark(sorts, sizes = None, inputs = inputs, repeats = 3,
+			  time_limit = 5.0, instrument_limit = 1.0, seed = 1):
+	# Returns a list of records, one per sort, input and size. Under
+	# tracemalloc or instrument, a sort written in Python runs many
+	# times slower, so we only measure memory and count operations
+	# when the timed run took at most instrument_limit seconds.
+	sizes = sizes or [10**k for k in range(1, 8)]
+	rng = np.random.default_rng(seed)
+	records = []
+	for input_name, make in inputs.items():
+		data = {} # the same input for every sort
+		for sort in sorts:
+			for n in sizes:
+				if n > sort.max_n:
+					break
+				if n not in data:
+					data[n] = make(n, rng)
+				x = data[n]
+				record = dict.fromkeys(columns)
+				record.update(input=input_name, n=n, algorithm=sort.name,
+							  seconds=time_sort(sort, x, repeats))
+				if record['seconds'] <= instrument_limit:
+					record['peak_bytes'] = peak_memory(sort, x)
+					if sort.takes == 'list':
+						record.update(count_operations(sort, x))
+				records.append(record)
+				if record['seconds'] > time_limit:
+					break
+	return records
+
+
+## Growth
+
+def fit_exponent(ns, ys, min_y = 1e-3):
+	# k in y = c * n^k, from the points with y >= min_y; times below a
+	# millisecond are mostly overhead and noise.
+	points = [(n, y) for n, y in zip(ns, ys) if y is not None and y >= min_y]
+	if len(points) < 2:
+		return None
+	logs = np.log(np.array(points, dtype=float))
+	k, _ = np.polyfit(logs[:,0], logs[:,1], 1)
+	return round(float(k), 2)
+
+def growth(records):
+	groups = {}
+	for r in records:
+		groups.setdefault((r['algorithm'], r['input']), []).append(r)
+	result = []
+	for (algorithm, input_name), rs in groups.items():
+		ns = [r['n'] for r in rs]
+		result.append({
+			'algorithm': algorithm, 'input': input_name, 'max_n': max(ns),
+			'time_exponent': fit_exponent(ns, [r['seconds'] for r in rs]),
+			'comparison_exponent': fit_exponent(ns, [r['comparisons'] for r in rs], 1),
+		})
+	return result
+
+
+## Output
+
+def write_csv(records, file):
+	writer = csv.DictWriter(file, fieldnames=columns)
+	writer.writeheader()
+	writer.writerows(records)
+
+def write_json(records, file):
+	json.dump({'records': records, 'growth': growth(records)}, file, indent=1)
+
+def print_growth(records):
+	print("algorithm input max_n time_exponent comparison_exponent")
+	for g in growth(records):
+		print(g['algorithm'], g['input'], g['max_n'], g['time_exponent'], g['comparison_exponent'])
+
+
+sorts = load_sorts()
+small = [s for s in sorts if s.name in ('insertion', 'merge_sort', 'sorted', 'np.sort')]
+records = benchmark(small, sizes=[10, 100, 1000], repeats=1)
+assert len(records) == 3 * len(small) * len(inputs)
+for r in records:
+	if r['algorithm'] == 'insertion' and r['input'] == 'sorted':
+		assert r['comparisons'] == r['n'] - 1 and r['swaps'] == 0
+	if r['algorithm'] == 'insertion' and r['input'] == 'reversed':
+		assert r['swaps'] == r['n'] * (r['n'] - 1) // 2
+	if r['algorithm'] == 'sorted' and r['input'] == 'sorted':
+		assert r['comparisons'] == r['n'] - 1
+assert fit_exponent([10, 100, 1000], [1, 100, 10000]) == 2.0
+out = io.StringIO()
+write_csv(records[:2], out)
+print(out.getvalue(), end='')
+print_growth([r for r in records if r['input'] == 'reversed'])
+
+
+if __name__ == '__main__':
+	records = benchmark(sorts)
+	with open('sort-benchmark.csv', 'w', newline='') as f:
+		write_csv(records, f)
+	with open('sort-benchmark.json', 'w') as f:
+		write_json(records, f)
+	print_growth(records)
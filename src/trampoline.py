@@ -78,3 +78,157 @@ def fib(n):
 print(fib(3))
 print(fib(4))
 print(fib(5))
+
+thunk_factorial = factorial # the versions above, for comparison
+thunk_fib = fib
+
+## Trampolines without closures
+# make_thunk allocates a new closure for every bounce, and the CPS
+# fib allocates two lambdas per call. Instead, a tail call can be a
+# Bounce, a tuple of the function to call and its arguments, and the
+# runtime calls it in a loop.
+#
+# Calls that are not tail calls need a continuation. We keep those on
+# an explicit stack, flat, with each continuation on top of its
+# argument, so pushing one allocates nothing. When a step returns a
+# value rather than a Bounce, the runtime pops the top continuation
+# and its argument and calls it with the value, the argument, and the
+# stack's push, so it can push more work of its own.
+
+class Bounce(tuple):
+	__slots__ = ()
+
+def run(step, stack = None):
+	if stack is None:
+		stack = []
+	push, pop = stack.append, stack.pop
+	while True:
+		while type(step) is Bounce:
+			f, args = step
+			step = f(*args)
+		if not stack:
+			return step
+		step = pop()(step, pop(), push)
+
+def factorial_step(n, acc = 1):
+	if n == 1:
+		return acc
+	else:
+		return Bounce((factorial_step, (n - 1, acc * n)))
+
+def factorial(n):
+	return run(factorial_step(n))
+
+# fib_step pushes "add fib(n - 2)" and then fib(n - 1) itself, so
+# fib(n - 1) runs first; fib_second then pushes "add x" and fib(n - 2).
+# They ignore the value they are called with, since they only start
+# new work.
+def fib_step(_, n, push):
+	if n < 2:
+		return n
+	push(n)
+	push(fib_second)
+	push(n - 1)
+	push(fib_step)
+
+def fib_second(x, n, push):
+	push(x)
+	push(add)
+	push(n - 2)
+	push(fib_step)
+
+def add(y, x, push):
+	return x + y
+
+def fib(n):
+	return run(None, [n, fib_step])
+
+# A decorator for tail-recursive functions. While the function
+# is running, its calls to itself return a Bounce instead of
+# recursing, and the outermost call runs them in a loop.
+# Tail calls between two decorated functions also work, since
+# each one bounces back to whichever loop is already running.
+# Each thread runs its own loop, so whether one is running is
+# kept per thread.
+#
+# That only works for tail calls. Every call made while the loop
+# runs gets a Bounce, so a call whose result is used, as in
+# 1 + f(n - 1), gets a Bounce where it expects a value. Decorated
+# functions must only be called in tail position from inside the
+# loop. Setting the wrapper's trampolined to False turns it back into
+# a plain call, for when that turns out not to hold.
+
+from functools import wraps, partial
+from threading import local
+
+def trampolined(f):
+	state = local()
+	@wraps(f)
+	def wrapper(*args, **kwargs):
+		if not wrapper.trampolined:
+			return f(*args, **kwargs)
+		g = partial(f, **kwargs) if kwargs else f
+		if getattr(state, 'running', False):
+			return Bounce((g, args))
+		state.running = True
+		try:
+			return run(Bounce((g, args)))
+		finally:
+			state.running = False
+	wrapper.trampolined = True
+	return wrapper
+
+@trampolined
+def factorial_rec(n, acc = 1):
+	if n == 1:
+		return acc
+	else:
+		return factorial_rec(n - 1, acc = acc * n)
+
+@trampolined
+def is_even(n):
+	return True if n == 0 else is_odd(n - 1)
+
+@trampolined
+def is_odd(n):
+	return False if n == 0 else is_even(n - 1)
+
+
+if __name__ == '__main__':
+	for n in range(1, 15):
+		assert factorial(n) == factorial_rec(n) == thunk_factorial(n)
+		assert fib(n) == thunk_fib(n)
+	print(factorial(5), factorial_rec(5), fib(10))
+	print(is_even(10**5), is_odd(10**5))
+
+	# another thread calling while one loop runs gets its own loop
+	from threading import Thread
+	results = []
+	worker = Thread(target = lambda: results.append(is_even(10**6)))
+	worker.start()
+	results.append(is_even(4))
+	worker.join()
+	assert results == [True, True]
+
+	from time import perf_counter
+	print("algorithm n seconds")
+	runs = [
+		('thunk_factorial', thunk_factorial, 10**5),
+		('factorial', factorial, 10**5),
+		('factorial_rec', factorial_rec, 10**5),
+		('thunk_fib', thunk_fib, 22),
+		('fib', fib, 22),
+		('thunk_fib', thunk_fib, 24),
+		('fib', fib, 24),
+	]
+	# without the big integers, so we only see the trampoline
+	def count_thunk(n):
+		return n if n == 0 else make_thunk(count_thunk, n - 1)
+	def count_step(n):
+		return n if n == 0 else Bounce((count_step, (n - 1,)))
+	runs.append(('thunk_count', lambda n: trampoline(count_thunk(n)), 10**6))
+	runs.append(('count', lambda n: run(count_step(n)), 10**6))
+	for name, f, n in runs:
+		start = perf_counter()
+		f(n)
+		print(name, n, round(perf_counter() - start, 3))